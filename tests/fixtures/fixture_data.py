@@ -12,6 +12,12 @@ def mock_media(settings):
         yield temp_directory
 
 
+@pytest.fixture(autouse=True)
+def local_queues(settings, tmp_path):
+    settings.THUMBNAIL_QUEUE_PATH = str(tmp_path / 'thumbnail_queue.sqlite3')
+    settings.COMMENT_QUEUE_PATH = str(tmp_path / 'comment_queue.sqlite3')
+
+
 @pytest.fixture
 def mixer():
     return _mixer
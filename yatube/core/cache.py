@@ -0,0 +1,211 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from . import holes
+
+GENERATION_KEY = 'generation:{}'
+PAGE_KEY = 'page:{}:{}:{}'
+LOCK_KEY = 'lock:{}'
+LOCK_POLL = 0.05
+
+
+def get_generation(name):
+    """Текущее поколение данных ``name``.
+
+    Начальное значение берётся от часов, а не с единицы: после вытеснения
+    ключа из кэша нумерация не повторится и старые страницы не оживут.
+    """
+    key = GENERATION_KEY.format(name)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), settings.GENERATION_TIMEOUT)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(name):
+    """Делает устаревшими все страницы, закэшированные для ``name``."""
+    bump_generations([name])
+
+
+def bump_generations(names):
+    """Сдвигает сразу много поколений: одно чтение и одна запись в кэш.
+
+    Новое поколение — время изменения в наносекундах, поэтому по нему же
+    строится ``Last-Modified``. Одновременные сдвиги могут затереть друг
+    друга, но поколение при этом всё равно сменится.
+    """
+    keys = [GENERATION_KEY.format(name) for name in names]
+    if not keys:
+        return
+    current = cache.get_many(keys)
+    now = time.time_ns()
+    cache.set_many({key: max(now, current.get(key, 0) + 1) for key in keys},
+                   settings.GENERATION_TIMEOUT)
+
+
+def generation_time(name):
+    """Время последней смены поколения ``name`` в секундах."""
+    return get_generation(name) // 10 ** 9
+
+
+def get_or_rebuild(key, build, timeout, soft_timeout=None, version=None,
+                   cacheable=None, on_stale=None):
+    """Значение из кэша, которое пересобирает только один запрос.
+
+    Запись живёт ``timeout`` секунд (жёсткий срок), но через
+    ``soft_timeout`` или при смене ``version`` считается устаревшей.
+    Устаревшую запись пересобирает тот, кто первым взял блокировку
+    ``cache.add``; остальные в это время получают старую копию и не
+    нагружают базу. Если копии нет совсем, они ждут до
+    ``CACHE_LOCK_WAIT`` секунд и лишь потом собирают значение сами.
+    ``cacheable`` решает, можно ли сохранить собранное значение, а
+    ``on_stale`` получает старую копию перед тем, как её отдать.
+    """
+    if soft_timeout is None:
+        soft_timeout = timeout
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until, entry_version = entry
+        if entry_version == version and fresh_until > time.time():
+            return value
+    lock = LOCK_KEY.format(key)
+    locked = cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return on_stale(entry[0]) if on_stale else entry[0]
+        entry = _wait_for(key, version)
+        if entry is not None:
+            return entry[0]
+    try:
+        value = build()
+        if cacheable is None or cacheable(value):
+            cache.set(key, (value, time.time() + soft_timeout, version),
+                      timeout)
+    finally:
+        if locked:
+            cache.delete(lock)
+    return value
+
+
+def _wait_for(key, version):
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        entry = cache.get(key)
+        if entry is not None and entry[2] == version:
+            return entry
+    return None
+
+
+def page_key(request, generation_name, shared=False):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    user = 0 if shared else request.user.pk or 0
+    return PAGE_KEY.format(generation_name, user, path)
+
+
+def _is_cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def _mark_stale(response):
+    # Валидаторы conditional_page описывают свежие данные, а не эту копию.
+    response.stale = True
+    return response
+
+
+def _punched(view, request, *args, **kwargs):
+    request.punch_holes = True
+    try:
+        return view(request, *args, **kwargs)
+    finally:
+        # Страницу ошибки рисует уже обработчик, и дыр в ней быть не должно.
+        request.punch_holes = False
+
+
+def generation_cache_page(generation_name, timeout, soft_timeout=None,
+                          shared=False, version=None):
+    """Кэширует страницу до смены поколения ``generation_name``.
+
+    ``generation_name`` — имя поколения или функция от запроса, которая
+    его возвращает, например своё поколение для каждого пользователя.
+    ``version(request, *args, **kwargs)`` добавляет к поколению свои
+    данные страницы; ``None`` от неё — страницу не кэшировать.
+
+    В отличие от ``cache_page`` со сроком в секундах, страницу можно
+    держать часами: запись в данные сдвигает поколение, и страница
+    устаревает. Пересобирает её один запрос, остальные до конца
+    пересборки получают прежнюю копию (см. ``get_or_rebuild``);
+    ``soft_timeout`` дополнительно ограничивает свежесть по времени,
+    ``timeout`` — жёсткий срок хранения. Страницы различаются по
+    пользователю, так как шапка сайта показывает его имя; с ``shared``
+    страница одна на всех. Части, отмеченные ``{% hole %}``,
+    дорисовываются на каждом запросе: это и свои части пользователя, и
+    данные, которые меняются чаще поколения, вроде числа комментариев.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            name = (generation_name(request) if callable(generation_name)
+                    else generation_name)
+            current = get_generation(name)
+            if version is not None:
+                extra = version(request, *args, **kwargs)
+                if extra is None:
+                    return view(request, *args, **kwargs)
+                current = (current, extra)
+            response = get_or_rebuild(
+                page_key(request, name, shared),
+                lambda: _punched(view, request, *args, **kwargs),
+                timeout, soft_timeout, version=current,
+                cacheable=_is_cacheable, on_stale=_mark_stale)
+            return holes.fill(request, response)
+        return wrapper
+    return decorator
+
+
+def conditional_page(validators):
+    """Отвечает 304 на ``If-None-Match``/``If-Modified-Since`` до вьюхи.
+
+    ``validators(request, *args, **kwargs)`` дёшево, без запросов самой
+    страницы, возвращает ``(части ETag, Last-Modified в секундах или
+    None)`` либо ``None``, если страницы нет; прочитанное можно оставить
+    вьюхе в ``request.validated``. ETag слабый: токен CSRF в
+    формах меняет байты, но не смысл страницы; пользователь входит в него
+    всегда, ведь шапка показывает его имя. ``no-cache`` заставляет
+    браузер спрашивать сервер при каждом показе. Устаревшая копия от
+    ``generation_cache_page`` уходит без валидаторов.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            validated = validators(request, *args, **kwargs)
+            if validated is None:
+                return view(request, *args, **kwargs)
+            parts, last_modified = validated
+            raw = repr((request.user.pk, *parts)).encode()
+            etag = f'W/"{hashlib.md5(raw).hexdigest()}"'
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            if not getattr(response, 'stale', False):
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,93 @@
+import base64
+import json
+import re
+
+from django.template import Context, engines
+from django.utils.safestring import SafeData, mark_safe
+
+MARKER = '<!--hole:{}-->'
+MARKER_RE = re.compile(rb'<!--hole:([A-Za-z0-9_=-]+)-->')
+
+
+# Загрузчики данных для фрагментов: имя шаблона -> функция.
+_prefetchers = {}
+
+
+def prefetcher(template_name):
+    """Регистрирует загрузку данных для всех фрагментов ``template_name``.
+
+    ``func(request, holes)`` получает значения всех таких фрагментов
+    страницы разом и дополняет их — например, одним ``get_many`` вместо
+    чтения из кэша на каждый фрагмент.
+    """
+    def decorator(func):
+        _prefetchers[template_name] = func
+        return func
+    return decorator
+
+
+def prefetch(request, template_name, holes):
+    func = _prefetchers.get(template_name)
+    if func is not None and holes:
+        func(request, holes)
+
+
+def is_punching(context):
+    """Рисуется ли сейчас общая для всех пользователей страница."""
+    return getattr(context.get('request'), 'punch_holes', False)
+
+
+def punch(template_name, values):
+    """Метка, на место которой ``fill`` подставит фрагмент.
+
+    Значения из страницы едут в метке: строки — с пометкой, безопасны ли
+    они, остальное — как есть, если это число, ``bool`` или ``None``.
+    """
+    safe = [key for key, value in values.items()
+            if isinstance(value, SafeData)]
+    values = {key: value
+              if value is None or isinstance(value, (bool, int, float))
+              else str(value) for key, value in values.items()}
+    raw = json.dumps({'t': template_name, 'v': values, 's': safe})
+    return mark_safe(MARKER.format(
+        base64.urlsafe_b64encode(raw.encode()).decode()))
+
+
+def fill(request, response):
+    """Рисует фрагменты пользователя на месте меток в ``response``.
+
+    Контекст-процессоры выполняются один раз на запрос, загрузчики из
+    ``prefetcher`` — один раз на шаблон фрагмента, а каждый фрагмент —
+    лишь небольшой шаблон поверх этого контекста.
+    """
+    if not MARKER_RE.search(response.content):
+        return response
+    engine = engines['django'].engine
+    context = Context(autoescape=engine.autoescape)
+    for processor in engine.template_context_processors:
+        context.update(processor(request))
+
+    holes = {}
+    for payload in set(MARKER_RE.findall(response.content)):
+        hole = json.loads(base64.urlsafe_b64decode(payload))
+        for key in hole['s']:
+            hole['v'][key] = mark_safe(hole['v'][key])
+        holes[payload] = hole
+    by_template = {}
+    for hole in holes.values():
+        by_template.setdefault(hole['t'], []).append(hole['v'])
+    for template_name, values in by_template.items():
+        prefetch(request, template_name, values)
+
+    def render(match):
+        hole = holes[match.group(1)]
+        values = hole['v']
+        fragment = engine.get_template(hole['t'])
+        # Как Template.render, но без сигнала template_rendered: фрагмент
+        # — не страница, и тесты не должны принимать его за пересборку.
+        with context.render_context.push_state(fragment):
+            with context.bind_template(fragment), context.push(values):
+                return fragment.nodelist.render(context).encode()
+
+    response.content = MARKER_RE.sub(render, response.content)
+    return response
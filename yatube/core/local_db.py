@@ -0,0 +1,22 @@
+import os
+import sqlite3
+
+
+def connection(local, path, schema):
+    """Соединение потока с локальной базой SQLite ``path``.
+
+    ``local`` — ``threading.local`` владельца: у каждого потока своё
+    соединение, и оно открывается заново после fork и при смене пути.
+    Очереди в таких базах — уже принятая работа, поэтому журнал WAL и
+    ``synchronous=FULL``: запись не пропадёт и при падении машины.
+    """
+    owner = (os.getpid(), path)
+    if getattr(local, 'owner', None) != owner:
+        connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=FULL')
+        for statement in schema:
+            connection.execute(statement)
+        local.connection = connection
+        local.owner = owner
+    return local.connection
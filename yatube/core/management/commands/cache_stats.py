@@ -0,0 +1,24 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания и промахи двухуровневого кэша по уровням.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        if not hasattr(cache, 'shared_stats'):
+            raise CommandError('Кэш по умолчанию не двухуровневый.')
+        stats = cache.shared_stats()
+        for level in ('l1', 'l2'):
+            hits, misses = stats[f'{level}_hits'], stats[f'{level}_misses']
+            total = hits + misses
+            self.stdout.write(
+                f'{level.upper()}: попаданий {hits}, промахов {misses}, '
+                f'доля попаданий {hits / total if total else 0:.1%}'
+            )
+        if options['reset']:
+            cache.reset_stats()
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.template_warmup import compile_templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Разбирает все шаблоны проекта и показывает время разбора каждого, '
+        'от самых медленных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*',
+                            help='Только эти шаблоны, например base.html.')
+        parser.add_argument('--limit', type=int, default=0,
+                            help='Показать столько самых медленных; '
+                                 '0 — все.')
+
+    def handle(self, *args, **options):
+        results = compile_templates(options['names'] or None)
+        ordered = sorted(results, key=lambda result: -result[1])
+        if options['limit']:
+            ordered = ordered[:options['limit']]
+        for name, seconds, error in ordered:
+            mark = '  ОШИБКА' if error is not None else ''
+            self.stdout.write(f'{seconds * 1000:8.2f} ms  {name}{mark}')
+        total = sum(seconds for _, seconds, _ in results)
+        self.stdout.write(
+            f'Всего шаблонов: {len(results)}, {total * 1000:.1f} ms')
+        errors = [f'{name}: {error}'
+                  for name, _, error in results if error is not None]
+        if errors:
+            raise CommandError('Не разбираются:\n' + '\n'.join(errors))
@@ -0,0 +1,155 @@
+import mimetypes
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse,
+)
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+# Имена миниатюр sorl и картинок из ContentAddressedStorage выводятся из
+# содержимого: под тем же адресом другой файл не появится.
+CONTENT_NAMED = re.compile(r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+
+def _is_immutable(path):
+    return (path.startswith(thumbnail_settings.THUMBNAIL_PREFIX)
+            or CONTENT_NAMED.match(path) is not None)
+
+
+def _byte_range(header, size):
+    """``(start, end)`` включительно, ``None`` — отдать файл целиком.
+
+    Поддерживается один диапазон; несколько диапазонов отдаются целым
+    файлом, как разрешает RFC 7233. Недостижимый диапазон — ``ValueError``.
+    """
+    match = RANGE.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def _read(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(path, fullpath):
+    """Пустой ответ, по которому файл отдаст фронтовой прокси."""
+    response = HttpResponse()
+    if settings.MEDIA_OFFLOAD == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_PREFIX + path)
+    else:
+        response['X-Sendfile'] = fullpath
+    # Тип выставит прокси по файлу.
+    del response['Content-Type']
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Отдаёт файл из ``MEDIA_ROOT`` с валидаторами и диапазонами.
+
+    Сильный ETag и Last-Modified позволяют отвечать 304; ``Range``
+    даёт 206 с частью файла. Миниатюры и картинки с именем по хэшу
+    кэшируются навсегда. При ``MEDIA_OFFLOAD`` сам файл отдаёт прокси
+    (``X-Accel-Redirect`` для nginx, ``X-Sendfile`` для Apache и
+    lighttpd), а воркер не копирует ни байта.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(fullpath)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404('Файл не найден')
+    if not os.path.isfile(fullpath):
+        raise Http404('Файл не найден')
+
+    validators = HttpResponse()
+    validators['ETag'] = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    validators['Last-Modified'] = http_date(stat.st_mtime)
+    validators['Cache-Control'] = (
+        IMMUTABLE if _is_immutable(path)
+        else f'public, max-age={settings.MEDIA_MAX_AGE}')
+    conditional = get_conditional_response(
+        request, etag=validators['ETag'],
+        last_modified=int(stat.st_mtime), response=validators)
+    if conditional is not validators:
+        return conditional
+
+    if settings.MEDIA_OFFLOAD:
+        response = _offload(path, fullpath)
+    else:
+        response = _file_response(request, fullpath, stat.st_size,
+                                  validators['ETag'])
+        content_type, encoding = mimetypes.guess_type(fullpath)
+        response['Content-Type'] = (content_type
+                                    or 'application/octet-stream')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    for header in ('ETag', 'Last-Modified', 'Cache-Control'):
+        response[header] = validators[header]
+    return response
+
+
+def _file_response(request, fullpath, size, etag):
+    header = request.META.get('HTTP_RANGE', '')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and (if_range is None or if_range == etag):
+        try:
+            byte_range = _byte_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is not None:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _read(fullpath, start, end - start + 1), status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+            response['Accept-Ranges'] = 'bytes'
+            return response
+    response = FileResponse(open(fullpath, 'rb'))
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def media_urlpatterns():
+    """Адрес ``MEDIA_URL`` для ``serve``.
+
+    Без прокси файлы отдаются только при ``DEBUG``, как раньше делал
+    ``static()``; с ``MEDIA_OFFLOAD`` — всегда, ведь байты шлёт прокси.
+    """
+    if not (settings.DEBUG or settings.MEDIA_OFFLOAD):
+        return []
+    prefix = re.escape(settings.MEDIA_URL.lstrip('/'))
+    return [re_path(rf'^{prefix}(?P<path>.*)$', serve, name='media')]
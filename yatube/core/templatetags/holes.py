@@ -0,0 +1,23 @@
+from django import template
+
+from core.holes import is_punching, prefetch, punch
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, template_name, **values):
+    """Фрагмент, который у каждого пользователя свой.
+
+    ``{% hole 'posts/includes/edit_link.html' post_id=post.id %}`` в
+    обычной странице рисует шаблон сразу, как ``include``. В странице,
+    общей для всех (``generation_cache_page(..., shared=True)``),
+    оставляет метку, и фрагмент рисуется уже для того, кто её получил.
+    Фрагмент видит только переданные значения и контекст-процессоры.
+    """
+    if is_punching(context):
+        return punch(template_name, values)
+    prefetch(context.get('request'), template_name, [values])
+    fragment = context.template.engine.get_template(template_name)
+    with context.push(values):
+        return fragment.render(context)
@@ -0,0 +1,90 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core.cache import (
+    LOCK_KEY, bump_generation, get_generation, get_or_rebuild,
+)
+
+
+class GetOrRebuildTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = 0
+
+    def build(self):
+        self.builds += 1
+        return self.builds
+
+    def test_fresh_value_is_not_rebuilt(self):
+        self.assertEqual(get_or_rebuild('key', self.build, 60), 1)
+        self.assertEqual(get_or_rebuild('key', self.build, 60), 1)
+        self.assertEqual(self.builds, 1)
+
+    def test_soft_expiry_and_version_trigger_rebuild(self):
+        get_or_rebuild('key', self.build, 60, 10, version=1)
+        with mock.patch('core.cache.time.time',
+                        return_value=time.time() + 11):
+            self.assertEqual(get_or_rebuild('key', self.build, 60, 10,
+                                            version=1), 2)
+        self.assertEqual(
+            get_or_rebuild('key', self.build, 60, 10, version=2), 3)
+
+    def test_stale_copy_is_served_while_locked(self):
+        get_or_rebuild('key', self.build, 60, version=1)
+        cache.add(LOCK_KEY.format('key'), 1)
+        self.assertEqual(get_or_rebuild('key', self.build, 60, version=2), 1)
+        self.assertEqual(self.builds, 1)
+
+    def test_lock_is_released_after_failed_build(self):
+        def fail():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            get_or_rebuild('key', fail, 60)
+        self.assertIsNone(cache.get(LOCK_KEY.format('key')))
+
+    def test_uncacheable_value_is_not_stored(self):
+        get_or_rebuild('key', self.build, 60, cacheable=lambda value: False)
+        self.assertIsNone(cache.get('key'))
+
+    @override_settings(CACHE_LOCK_WAIT=5)
+    def test_cold_miss_waits_for_rebuilder(self):
+        cache.add(LOCK_KEY.format('key'), 1)
+        timer = threading.Timer(
+            0.1, lambda: cache.set('key', ('готово', time.time() + 60,
+                                           None)))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(get_or_rebuild('key', self.build, 60), 'готово')
+        self.assertEqual(self.builds, 0)
+
+    @override_settings(CACHE_LOCK_WAIT=0.1)
+    def test_cold_miss_builds_after_wait(self):
+        cache.add(LOCK_KEY.format('key'), 1)
+        self.assertEqual(get_or_rebuild('key', self.build, 60), 1)
+
+
+class GenerationTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(GENERATION_TIMEOUT=20)
+    def test_generation_expires_without_shared_cache(self):
+        generation = get_generation('feed')
+        bump_generation('feed')
+        bumped = get_generation('feed')
+        self.assertGreater(bumped, generation)
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=time.time() + 21):
+            self.assertNotEqual(get_generation('feed'), bumped)
+
+    @override_settings(GENERATION_TIMEOUT=None)
+    def test_generation_is_kept_with_shared_cache(self):
+        generation = get_generation('feed')
+        with mock.patch('django.core.cache.backends.locmem.time.time',
+                        return_value=time.time() + 60 * 60 * 24):
+            self.assertEqual(get_generation('feed'), generation)
@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase
+from django.utils.safestring import mark_safe
+
+from core import holes
+from core.holes import fill
+
+User = get_user_model()
+
+
+class HolesTest(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        self.request.user = User(username='reader')
+
+    def punched(self, source, **values):
+        self.request.punch_holes = True
+        html = Template('{% load holes %}' + source).render(
+            Context({'request': self.request, **values}))
+        self.request.punch_holes = False
+        return f'до {html} после'
+
+    def test_hole_renders_inline_outside_shared_pages(self):
+        html = Template('{% load holes %}{% hole "includes/header_user.html" '
+                        '%}').render(Context({'request': self.request,
+                                              'user': self.request.user}))
+        self.assertIn('Пользователь: reader', html)
+
+    def test_fill_renders_fragment_for_current_user(self):
+        page = self.punched('{% hole "includes/header_user.html" %}')
+        self.assertNotIn('Войти', page)
+        content = fill(self.request, HttpResponse(page)).content.decode()
+        self.assertIn('Пользователь: reader', content)
+        self.assertTrue(content.startswith('до '))
+        self.assertTrue(content.endswith(' после'))
+        self.request.user = AnonymousUser()
+        content = fill(self.request, HttpResponse(page)).content.decode()
+        self.assertIn('Войти', content)
+
+    def test_fill_escapes_unsafe_values_and_keeps_safe_ones(self):
+        page = self.punched(
+            '{% hole "posts/includes/edit_link.html" post_id=1 '
+            'author="reader" label=label %}'
+            '{% hole "posts/includes/comment_form.html" post_id=1 '
+            'field=field %}',
+            label='<b>', field=mark_safe('<textarea></textarea>'))
+        content = fill(self.request, HttpResponse(page)).content.decode()
+        self.assertIn('&lt;b&gt;', content)
+        self.assertIn('<textarea></textarea>', content)
+        self.assertIn('csrfmiddlewaretoken', content)
+
+    def test_prefetcher_runs_once_per_template(self):
+        calls = []
+
+        def load(request, holes):
+            calls.append(sorted(values['post_id'] for values in holes))
+            for values in holes:
+                values['label'] = f'пост {values["post_id"]}'
+
+        page = self.punched(
+            '{% hole "posts/includes/edit_link.html" post_id=1 '
+            'author="reader" %}'
+            '{% hole "posts/includes/edit_link.html" post_id=2 '
+            'author="reader" %}')
+        with mock.patch.dict(holes._prefetchers,
+                             {'posts/includes/edit_link.html': load}):
+            content = fill(self.request, HttpResponse(page)).content.decode()
+        self.assertEqual(calls, [[1, 2]])
+        self.assertIn('пост 1', content)
+        self.assertIn('пост 2', content)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.media import serve
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+DIGEST = 'ab' * 32
+CONTENT = bytes(range(256)) * 4
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, MEDIA_OFFLOAD=None)
+class MediaServeTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name in (f'posts/ab/{DIGEST}.gif', 'posts/old.gif'):
+            path = os.path.join(TEMP_MEDIA_ROOT, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as output:
+                output.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def get(self, path=f'posts/ab/{DIGEST}.gif', **headers):
+        request = RequestFactory().get('/media/' + path, **headers)
+        return serve(request, path)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_full_file_with_validators(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), CONTENT)
+        self.assertEqual(response['Content-Type'], 'image/gif')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertNotIn('immutable', self.get('posts/old.gif')[
+            'Cache-Control'])
+
+    def test_conditional_get_returns_304(self):
+        etag = self.get()['ETag']
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        last_modified = self.get()['Last-Modified']
+        self.assertEqual(
+            self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_range_requests(self):
+        response = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'],
+                         f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(self.body(response), CONTENT[10:20])
+        self.assertEqual(self.body(self.get(HTTP_RANGE='bytes=-5')),
+                         CONTENT[-5:])
+        self.assertEqual(self.get(HTTP_RANGE='bytes=5000-').status_code,
+                         416)
+        stale = self.get(HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_missing_and_escaping_paths_are_404(self):
+        with self.assertRaises(Http404):
+            self.get('posts/none.gif')
+        with self.assertRaises(Http404):
+            self.get('../manage.py')
+
+    @override_settings(MEDIA_OFFLOAD='x-accel-redirect')
+    def test_accel_redirect_sends_no_body(self):
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'],
+                         f'/protected-media/posts/ab/{DIGEST}.gif')
+        self.assertEqual(response.content, b'')
+        self.assertIn('ETag', response)
+
+    @override_settings(MEDIA_OFFLOAD='x-sendfile')
+    def test_sendfile(self):
+        response = self.get('posts/old.gif')
+        self.assertEqual(response['X-Sendfile'],
+                         os.path.join(TEMP_MEDIA_ROOT, 'posts/old.gif'))
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, override_settings
+
+from core.template_warmup import compile_templates, project_templates
+
+
+class TemplateWarmupTest(SimpleTestCase):
+    def test_all_project_templates_compile(self):
+        names = project_templates()
+        self.assertIn('base.html', names)
+        self.assertIn('includes/header.html', names)
+        # Шаблоны админки и библиотек не наши.
+        self.assertNotIn('admin/base.html', names)
+        self.assertEqual(
+            [name for name, _, error in compile_templates() if error], [])
+
+    def test_command_reports_slowest_first(self):
+        output = StringIO()
+        call_command('compile_templates', '--limit', '3', stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 4)
+        times = [float(line.split()[0]) for line in lines[:3]]
+        self.assertEqual(times, sorted(times, reverse=True))
+
+    def test_broken_template_fails_command(self):
+        directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, 'broken.html'), 'w') as broken:
+            broken.write('{% if %}')
+        templates = [{**settings.TEMPLATES[0], 'DIRS': [directory]}]
+        with override_settings(TEMPLATES=templates):
+            with self.assertRaisesMessage(CommandError, 'broken.html'):
+                call_command('compile_templates', stdout=StringIO())
@@ -0,0 +1,81 @@
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from core.tiered_cache import TieredCache
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+        self.cache = TieredCache(self.path, {'OPTIONS': {'L1_TIMEOUT': 60}})
+        self.cache.clear()
+        self.cache.reset_stats()
+
+    def foreign_write(self, key, value):
+        """Запись в L2 от имени другого процесса, мимо L1 этого."""
+        key = self.cache.make_key(key)
+        with sqlite3.connect(self.path, isolation_level=None) as other:
+            other.execute(
+                'INSERT OR REPLACE INTO cache VALUES (?, ?, NULL)',
+                (key, pickle.dumps(value)))
+            other.execute(
+                'INSERT INTO invalidations (owner, key) VALUES (?, ?)',
+                ('other', key))
+
+    def test_basic_operations(self):
+        self.assertIsNone(self.cache.get('missing'))
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 1))
+        self.assertEqual(self.cache.incr('new', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set_many({'x': 1, 'y': 2})
+        self.assertEqual(self.cache.get_many(['x', 'y', 'z']),
+                         {'x': 1, 'y': 2})
+        self.cache.delete('x')
+        self.assertFalse(self.cache.has_key('x'))
+        self.cache.set('short', 1, 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+
+    def test_values_are_shared_through_l2(self):
+        self.cache.set('key', 'value')
+        other = TieredCache(self.path, {})
+        other.l1.clear()
+        self.assertEqual(other.get('key'), 'value')
+        self.assertEqual(other.stats()['l2_hits'], 1)
+
+    def test_foreign_write_invalidates_l1(self):
+        self.cache.set('key', 'old')
+        self.assertEqual(self.cache.get('key'), 'old')
+        self.foreign_write('key', 'new')
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_foreign_clear_empties_l1(self):
+        self.cache.set('key', 'value')
+        with sqlite3.connect(self.path, isolation_level=None) as other:
+            other.execute('DELETE FROM cache')
+            other.execute("INSERT INTO invalidations (owner, key) "
+                          "VALUES ('other', '')")
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_stats_per_level(self):
+        self.cache.set('key', 1)
+        self.cache.get('key')
+        self.cache.l1.clear()
+        self.cache.get('key')
+        self.cache.get('missing')
+        self.assertEqual(self.cache.stats(), {
+            'l1_hits': 1, 'l1_misses': 2, 'l2_hits': 1, 'l2_misses': 1,
+        })
+        self.assertEqual(self.cache.shared_stats()['l1_hits'], 1)
@@ -0,0 +1,392 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    ' key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+    'CREATE TABLE IF NOT EXISTS invalidations ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT, owner TEXT, key TEXT)',
+    'CREATE TABLE IF NOT EXISTS stats ('
+    ' owner TEXT PRIMARY KEY, l1_hits INTEGER, l1_misses INTEGER,'
+    ' l2_hits INTEGER, l2_misses INTEGER, updated REAL)',
+)
+STAT_FIELDS = ('l1_hits', 'l1_misses', 'l2_hits', 'l2_misses')
+# Метка «очистить всё» в журнале инвалидаций.
+CLEAR = ''
+
+# Состояние процесса, общее для экземпляров бэкенда во всех потоках
+# (Django создаёт экземпляр кэша на поток): L1 и счётчики по LOCATION.
+_shared = {}
+_shared_lock = threading.Lock()
+_process = [None, None]
+
+
+def _owner():
+    """Метка процесса в журнале; после fork у потомка своя, L1 пуст."""
+    pid = os.getpid()
+    if _process[0] != pid:
+        with _shared_lock:
+            if _process[0] != pid:
+                _process[:] = [pid, uuid.uuid4().hex]
+                for shared in _shared.values():
+                    shared.l1.clear()
+                    shared.seen = None
+    return _process[1]
+
+
+class _Shared:
+    def __init__(self, max_entries):
+        self.l1 = _L1(max_entries)
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.flushed = time.monotonic()
+        # Последняя прочитанная запись журнала инвалидаций.
+        self.seen = None
+
+
+class _L1:
+    """Кэш процесса: LRU из сериализованных значений со своим сроком."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, blob, expires):
+        with self.lock:
+            self.data[key] = (expires, blob)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: L1 в памяти процесса, L2 — общий файл SQLite.
+
+    L2 лежит в ``LOCATION`` в режиме WAL и общий для всех воркеров
+    хоста, внешних сервисов не нужно. L1 держит значение не дольше
+    ``L1_TIMEOUT`` секунд и сбрасывается по журналу инвалидаций: каждая
+    запись в L2 оставляет в журнале ключ, а перед чтением процесс
+    сверяет ``PRAGMA data_version`` и, если файл менял кто-то другой,
+    выбрасывает из L1 перечисленные там ключи.
+
+    Попадания и промахи по уровням: ``stats()`` — этого процесса,
+    ``shared_stats()`` — сумма по процессам, которые сбрасывают свои
+    счётчики в L2 не реже раза в ``STATS_INTERVAL`` секунд.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.log_length = options.get('INVALIDATION_LOG', 10000)
+        self.stats_interval = options.get('STATS_INTERVAL', 10)
+        with _shared_lock:
+            self.shared = _shared.setdefault(
+                location, _Shared(options.get('L1_MAX_ENTRIES', 1000)))
+        self.l1 = self.shared.l1
+        self.local = threading.local()
+
+    # Соединение и журнал.
+
+    @property
+    def owner(self):
+        return _owner()
+
+    def connection(self):
+        owner = self.owner
+        if getattr(self.local, 'owner', None) != owner:
+            connection = sqlite3.connect(self.path, timeout=5,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self.local.connection = connection
+            self.local.owner = owner
+            self.local.data_version = None
+            with self.shared.lock:
+                if self.shared.seen is None:
+                    # L1 процесса ещё пуст: старый журнал ему не нужен.
+                    self.shared.seen = connection.execute(
+                        'SELECT COALESCE(MAX(id), 0) FROM invalidations'
+                    ).fetchone()[0]
+        return self.local.connection
+
+    def sync(self):
+        """Выбрасывает из L1 ключи, которые другие процессы поменяли в L2."""
+        connection = self.connection()
+        version = connection.execute('PRAGMA data_version').fetchone()[0]
+        if version == self.local.data_version:
+            return
+        self.local.data_version = version
+        with self.shared.lock:
+            seen = self.shared.seen
+        rows = connection.execute(
+            'SELECT id, owner, key FROM invalidations WHERE id > ? '
+            'ORDER BY id', (seen,)).fetchall()
+        if not rows:
+            return
+        if seen and rows[0][0] > seen + 1:
+            # Журнал успели подрезать: что пропущено, неизвестно.
+            self.l1.clear()
+        foreign = [key for _, owner, key in rows if owner != self.owner]
+        if CLEAR in foreign:
+            self.l1.clear()
+        else:
+            self.l1.discard(foreign)
+        with self.shared.lock:
+            self.shared.seen = max(self.shared.seen, rows[-1][0])
+
+    def write(self, statements, keys):
+        """Выполняет изменения L2 и запись в журнал одной транзакцией."""
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(connection)
+            connection.executemany(
+                'INSERT INTO invalidations (owner, key) VALUES (?, ?)',
+                [(self.owner, key) for key in keys])
+            last = connection.execute(
+                'SELECT last_insert_rowid()').fetchone()[0]
+            # Раз в тысячу записей подрезаем журнал и чистим просроченное.
+            if last // 1000 > (last - len(keys)) // 1000:
+                connection.execute(
+                    'DELETE FROM invalidations WHERE id <= ?',
+                    (last - self.log_length,))
+                connection.execute(
+                    'DELETE FROM cache WHERE expires < ?', (time.time(),))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return result
+
+    # Статистика.
+
+    def count(self, **deltas):
+        with self.shared.lock:
+            self.shared.counts.update(deltas)
+        if time.monotonic() - self.shared.flushed >= self.stats_interval:
+            self.flush_stats()
+
+    def stats(self):
+        with self.shared.lock:
+            return {field: self.shared.counts[field]
+                    for field in STAT_FIELDS}
+
+    def flush_stats(self):
+        self.shared.flushed = time.monotonic()
+        stats = self.stats()
+        self.connection().execute(
+            'INSERT OR REPLACE INTO stats VALUES (?, ?, ?, ?, ?, ?)',
+            (self.owner, *(stats[field] for field in STAT_FIELDS),
+             time.time()))
+
+    def shared_stats(self):
+        self.flush_stats()
+        row = self.connection().execute(
+            'SELECT ' + ', '.join(f'COALESCE(SUM({field}), 0)'
+                                  for field in STAT_FIELDS)
+            + ' FROM stats').fetchone()
+        return dict(zip(STAT_FIELDS, row))
+
+    def reset_stats(self):
+        with self.shared.lock:
+            self.shared.counts.clear()
+        self.connection().execute('DELETE FROM stats')
+
+    # Чтение.
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return float('inf') if expires is None else expires
+
+    def _l1_expires(self, expires):
+        return min(expires, time.time() + self.l1_timeout)
+
+    def _fetch(self, keys):
+        """``{key: (blob, expires)}`` живых ключей: L1, затем L2."""
+        self.sync()
+        found, missing = {}, []
+        for key in keys:
+            blob = self.l1.get(key)
+            if blob is None:
+                missing.append(key)
+            else:
+                found[key] = (blob, None)
+        self.count(l1_hits=len(found), l1_misses=len(missing))
+        if not missing:
+            return found
+        rows = self.connection().execute(
+            'SELECT key, value, expires FROM cache WHERE key IN (%s) '
+            'AND (expires IS NULL OR expires > ?)'
+            % ', '.join('?' * len(missing)), (*missing, time.time()))
+        fetched = {key: (bytes(blob), expires)
+                   for key, blob, expires in rows}
+        for key, (blob, expires) in fetched.items():
+            self.l1.set(key, blob, self._l1_expires(
+                float('inf') if expires is None else expires))
+        self.count(l2_hits=len(fetched),
+                   l2_misses=len(missing) - len(fetched))
+        found.update(fetched)
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        found = self._fetch([key])
+        if key not in found:
+            return default
+        return pickle.loads(found[key][0])
+
+    def get_many(self, keys, version=None):
+        made = {self.make_key(key, version=version): key for key in keys}
+        for key in made:
+            self.validate_key(key)
+        found = self._fetch(list(made))
+        return {made[key]: pickle.loads(blob)
+                for key, (blob, _) in found.items()}
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key in self._fetch([key])
+
+    # Запись.
+
+    def _store(self, items, expires):
+        def statements(connection):
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                [(key, blob, None if expires == float('inf') else expires)
+                 for key, blob in items.items()])
+        self.write(statements, list(items))
+        for key, blob in items.items():
+            self.l1.set(key, blob, self._l1_expires(expires))
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._store({key: pickle.dumps(value, pickle.HIGHEST_PROTOCOL)},
+                    self._expires(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        items = {}
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            items[key] = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if items:
+            self._store(items, self._expires(timeout))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = self._expires(timeout)
+
+        def statements(connection):
+            row = connection.execute(
+                'SELECT 1 FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            if row is not None:
+                return False
+            connection.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, blob, None if expires == float('inf') else expires))
+            return True
+        added = self.write(statements, [key])
+        if added:
+            self.l1.set(key, blob, self._l1_expires(expires))
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+
+        def statements(connection):
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key))
+            return value
+        value = self.write(statements, [key])
+        self.l1.discard([key])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        expires = self._expires(timeout)
+
+        def statements(connection):
+            return connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ?',
+                (None if expires == float('inf') else expires, key),
+            ).rowcount > 0
+        touched = self.write(statements, [key])
+        self.l1.discard([key])
+        return touched
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_key(key, version=version) for key in keys]
+        for key in made:
+            self.validate_key(key)
+        if not made:
+            return
+        self.write(lambda connection: connection.executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in made]),
+            made)
+        self.l1.discard(made)
+
+    def clear(self):
+        self.write(lambda connection: connection.execute(
+            'DELETE FROM cache'), [CLEAR])
+        self.l1.clear()
+
+    def close(self, **kwargs):
+        # Соединения живут в потоках весь их срок, как у LocMemCache.
+        pass
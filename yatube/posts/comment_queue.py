@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished
+from django.db import transaction
+from django.dispatch import receiver
+
+from core import local_db
+
+from . import counters, summaries
+from .models import Comment, Post
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS queue ('
+    ' id INTEGER PRIMARY KEY AUTOINCREMENT, uid TEXT NOT NULL,'
+    ' post_id INTEGER NOT NULL, author_id INTEGER NOT NULL,'
+    ' text TEXT NOT NULL, queued REAL NOT NULL, claim TEXT, claimed REAL)',
+    'CREATE INDEX IF NOT EXISTS queue_claim ON queue (claim, id)',
+)
+# Пачку, которую забравший так и не записал (упал воркер), через столько
+# секунд забирает следующий.
+CLAIM_TIMEOUT = 60
+
+_local = threading.local()
+
+
+def is_queued():
+    return settings.COMMENT_INGEST == 'queued'
+
+
+def connection():
+    return local_db.connection(_local, settings.COMMENT_QUEUE_PATH, SCHEMA)
+
+
+def push(post_id, author_id, text):
+    """Принимает комментарий; в БД он попадёт со следующим ``flush``.
+
+    Ключ ``uid`` уходит в ``Comment.queue_key``. Это не ``id`` строки:
+    тот начнётся заново, если файл очереди пересоздать.
+    """
+    connection().execute(
+        'INSERT INTO queue (uid, post_id, author_id, text, queued) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (uuid.uuid4().hex, post_id, author_id, text, time.time()))
+
+
+def oldest_age():
+    """Сколько секунд ждёт самый старый комментарий, ``None`` — никто."""
+    row = connection().execute(
+        'SELECT queued FROM queue ORDER BY id LIMIT 1').fetchone()
+    return None if row is None else time.time() - row[0]
+
+
+def _claim(limit):
+    claim = uuid.uuid4().hex
+    now = time.time()
+    connection().execute(
+        'UPDATE queue SET claim = ?, claimed = ? WHERE id IN ('
+        ' SELECT id FROM queue WHERE claim IS NULL OR claimed < ?'
+        ' ORDER BY id LIMIT ?)', (claim, now, now - CLAIM_TIMEOUT, limit))
+    rows = connection().execute(
+        'SELECT uid, post_id, author_id, text, queued FROM queue '
+        'WHERE claim = ? ORDER BY id', (claim,)).fetchall()
+    return claim, rows
+
+
+def _write(rows):
+    posts = set(Post.objects.filter(
+        pk__in={row[1] for row in rows}
+    ).order_by().values_list('pk', flat=True))
+    authors = set(User.objects.filter(
+        pk__in={row[2] for row in rows}
+    ).values_list('pk', flat=True))
+    with transaction.atomic():
+        written = {key.hex for key in Comment.objects.filter(
+            queue_key__in=[row[0] for row in rows]
+        ).values_list('queue_key', flat=True)}
+        # Пост или автора могли удалить, пока комментарий ждал в очереди.
+        comments = [
+            Comment(post_id=post_id, author_id=author_id, text=text,
+                    queue_key=uid)
+            for uid, post_id, author_id, text, _ in rows
+            if uid not in written and post_id in posts
+            and author_id in authors
+        ]
+        added = Counter(comment.post_id for comment in comments)
+        Comment.objects.bulk_create(comments)
+        # auto_now_add ставит время записи; комментарию нужно время,
+        # когда его отправили.
+        queued = {uid: datetime.fromtimestamp(at, timezone.utc)
+                  for uid, _, _, _, at in rows}
+        stored = list(Comment.objects.filter(
+            queue_key__in=[comment.queue_key for comment in comments]
+        ).only('pk', 'queue_key'))
+        for comment in stored:
+            comment.created = queued[comment.queue_key.hex]
+        Comment.objects.bulk_update(stored, ['created'])
+        for post_id, count in added.items():
+            counters.bump_post(post_id, count)
+    if added:
+        summaries.invalidate(list(added))
+    return len(comments)
+
+
+def flush(batch_size=None):
+    """Записывает очередь в БД пачками, возвращает число комментариев.
+
+    ``bulk_create`` не шлёт сигналов, поэтому счётчики постов и кэши
+    страниц сдвигаются здесь, один раз на пост и на пачку. Пачка
+    удаляется из очереди только после фиксации транзакции: если воркер
+    упадёт между ними, пачку заберёт следующий, но уже записанные
+    комментарии узнает по ``queue_key`` и не задвоит. Несколько
+    флашеров сразу не мешают друг другу: каждый забирает свою пачку.
+    """
+    batch_size = batch_size or settings.COMMENT_BATCH_SIZE
+    written = 0
+    while True:
+        claim, rows = _claim(batch_size)
+        if not rows:
+            return written
+        written += _write(rows)
+        connection().execute('DELETE FROM queue WHERE claim = ?', (claim,))
+
+
+@receiver(request_finished)
+def _flush_due(sender, **kwargs):
+    """Сбрасывает очередь после ответа, когда подошёл её срок."""
+    if not is_queued():
+        return
+    try:
+        age = oldest_age()
+        if age is not None and age >= settings.COMMENT_FLUSH_INTERVAL:
+            flush()
+    except Exception:
+        # Ответ уже отдан; очередь сбросит следующий запрос или
+        # manage.py flush_comments.
+        logger.exception('Не удалось сбросить очередь комментариев')
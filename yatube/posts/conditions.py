@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.db.models import (
+    BooleanField, Exists, OuterRef, Subquery, Value,
+)
+
+from core.cache import generation_time, get_generation
+
+from .counters import stats_for
+from .models import Comment, Follow, Post
+
+User = get_user_model()
+
+# Валидаторы для core.cache.conditional_page читают только версии и
+# счётчики, а не саму страницу; прочитанный объект они оставляют вьюхе
+# в request.validated. Любая запись в посты, группы и имена авторов
+# сдвигает поколение 'feed', поэтому время его смены годится
+# в Last-Modified. Комментарии сдвигают своё поколение 'comments': их
+# сводки под карточками — фрагменты, и страниц они не сбрасывают, но
+# браузер должен увидеть новую сводку.
+
+
+def _generations():
+    return get_generation('feed'), get_generation('comments')
+
+
+def _last_modified():
+    return max(generation_time('feed'), generation_time('comments'))
+
+
+def feed(request, *args, **kwargs):
+    """Главная и лента группы меняются только со сменой поколений."""
+    return _generations(), _last_modified()
+
+
+def authors(request):
+    """Авторы со счётчиками и пометкой, подписан ли на них ``request``."""
+    authors = User.objects.select_related('stats')
+    if request.user.is_anonymous:
+        return authors.annotate(is_followed=Value(False, BooleanField()))
+    return authors.annotate(is_followed=Exists(Follow.objects.filter(
+        user=request.user, author=OuterRef('pk'))))
+
+
+def posts():
+    """Посты со всем, что показывает страница поста."""
+    last_comment = Comment.objects.filter(
+        post=OuterRef('pk')).order_by('-created').values('created')[:1]
+    return Post.objects.select_related('author__stats', 'group').annotate(
+        last_comment=Subquery(last_comment))
+
+
+def profile(request, username):
+    """Поколение, счётчики автора и подписка того, кто смотрит.
+
+    Подписки не сдвигают поколение и не оставляют времени, поэтому
+    у профиля только ETag.
+    """
+    author = authors(request).filter(username=username).first()
+    if author is None:
+        return None
+    request.validated = author
+    stats = stats_for(author)
+    return (*_generations(), author.pk, stats.posts_count,
+            stats.followers_count, stats.following_count,
+            author.is_followed), None
+
+
+def post_detail(request, post_id):
+    """Версия поста, его комментарии и счётчик постов автора."""
+    post = posts().filter(pk=post_id).first()
+    if post is None:
+        return None
+    request.validated = post
+    last_modified = _last_modified()
+    if post.last_comment is not None:
+        last_modified = max(last_modified,
+                            int(post.last_comment.timestamp()))
+    return (get_generation('feed'), post.version, post.comments_count,
+            stats_for(post.author).posts_count, post.last_comment,
+            ), last_modified
+
+
+def profile_version(request, username):
+    """Счётчики автора для кэша профиля: подписки не сдвигают поколение."""
+    author = getattr(request, 'validated', None)
+    if author is None:
+        return None
+    stats = stats_for(author)
+    return stats.posts_count, stats.followers_count, stats.following_count
+
+
+def post_version(request, post_id):
+    """Версия поста и его комментарии для кэша страницы поста."""
+    post = getattr(request, 'validated', None)
+    if post is None:
+        return None
+    return post.version, post.comments_count, post.last_comment
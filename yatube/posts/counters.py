@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+def stats_for(user):
+    """Счётчики пользователя; до первого события — нулевые."""
+    try:
+        return user.stats
+    except AuthorStats.DoesNotExist:
+        return AuthorStats(user=user)
+
+
+def bump_author(user_id, create=True, **deltas):
+    """Атомарно сдвигает счётчики автора: ``bump_author(1, posts_count=1)``.
+
+    Строка счётчиков заводится при первом событии. Для уменьшений
+    ``create=False``: удаление автора каскадом уже убрало его строку.
+    """
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    # Счётчик не уходит ниже нуля, даже если успел разойтись с данными.
+    floors = {f'{field}__gte': -delta
+              for field, delta in deltas.items() if delta < 0}
+    stats = AuthorStats.objects.filter(user_id=user_id, **floors)
+    if not stats.update(**changes) and create:
+        AuthorStats.objects.get_or_create(user_id=user_id)
+        stats.update(**changes)
+
+
+def bump_post(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(field)
+        .annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+def recount():
+    """Пересчитывает все счётчики по живым данным, чиня расхождения."""
+    AuthorStats.objects.bulk_create(
+        (AuthorStats(user_id=pk) for pk in User.objects.filter(
+            stats__isnull=True).values_list('pk', flat=True).iterator()),
+        ignore_conflicts=True,
+    )
+    AuthorStats.objects.update(
+        posts_count=_count(Post.objects, 'author'),
+        followers_count=_count(Follow.objects, 'author'),
+        following_count=_count(Follow.objects, 'user'),
+    )
+    Post.objects.update(comments_count=_count(Comment.objects, 'post'))
@@ -0,0 +1,256 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from core.cache import bump_generations
+
+from .models import Follow, Post, TimelineEntry
+from .paginators import FORWARD, CursorPaginator, paginate
+
+RECENT_KEY = 'posts:recent:{}'
+FOLLOW_GENERATION = 'follow:{}'
+
+
+class TimelinePaginator(CursorPaginator):
+    """Листает ``TimelineEntry`` пользователя, а отдаёт сами посты."""
+
+    id_field = 'post_id'
+
+    def key(self, post):
+        return post.pub_date, post.id
+
+    def fetch(self, direction, key, limit, offset=0):
+        entries = super().fetch(direction, key, limit, offset)
+        return [entry.post for entry in entries]
+
+
+def timeline_for(user):
+    return TimelineEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group')
+
+
+def trim(user_ids):
+    """Обрезает ленты до ``TIMELINE_LENGTH`` самых свежих записей.
+
+    Два запроса на любое число лент: один находит ленты, переросшие
+    длину больше чем на ``TIMELINE_SLACK``, другой удаляет их хвосты.
+    Первый читает ленты целиком, поэтому при публикации ``trim`` не
+    зовётся — ленты подписчиков обрезает ``manage.py trim_timelines``,
+    а страницы хвостов всё равно не читают. Возвращает число
+    обрезанных лент.
+    """
+    limit = settings.TIMELINE_LENGTH
+    over = list(TimelineEntry.objects.filter(user_id__in=user_ids).order_by()
+                .values('user_id').annotate(total=Count('pk'))
+                .filter(total__gt=limit + settings.TIMELINE_SLACK)
+                .values_list('user_id', flat=True))
+    if not over:
+        return 0
+    ranked = TimelineEntry.objects.filter(user_id__in=over).order_by(
+    ).annotate(rank=Window(
+        RowNumber(), partition_by=[F('user_id')],
+        order_by=[F('pub_date').desc(), F('post_id').desc()],
+    )).values('pk', 'rank')
+    sql, params = ranked.query.sql_with_params()
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE id IN '
+            f'(SELECT id FROM ({sql}) WHERE rank > %s)', (*params, limit))
+    return len(over)
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора.
+
+    Один ``INSERT`` на всех подписчиков; ленты при этом не обрезаются.
+    """
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'id', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def drop(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def trim_all(batch_size):
+    """Обрезает все ленты, пачками по ``batch_size`` пользователей."""
+    users = TimelineEntry.objects.order_by('user_id').values_list(
+        'user_id', flat=True).distinct()
+    trimmed, last = 0, None
+    while True:
+        batch = users if last is None else users.filter(user_id__gt=last)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return trimmed
+        trimmed += trim(batch)
+        last = batch[-1]
+
+
+def rebuild(user_id):
+    """Собирает ленту пользователя заново по его подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = Post.objects.filter(
+        author__following__user_id=user_id
+    ).values_list('id', 'pub_date')[:settings.TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts
+    )
+
+
+def recent_keys(author_ids):
+    """Ключи ``(pub_date, id)`` последних постов каждого автора.
+
+    Списки живут в кэше по одному на автора и читаются одним
+    ``get_many``; за авторами, которых там нет, в БД идёт один запрос.
+    """
+    keys = {RECENT_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    found = cache.get_many(keys)
+    missing = {key: [] for key in keys if key not in found}
+    if missing:
+        for post in _recent_posts([keys[key] for key in missing]):
+            missing[RECENT_KEY.format(post.author_id)].append(
+                (post.pub_date, post.id))
+        cache.set_many(missing, settings.AUTHOR_RECENT_TIMEOUT)
+        found.update(missing)
+    return list(found.values())
+
+
+def _recent_posts(author_ids):
+    """Последние ``AUTHOR_RECENT_LENGTH`` постов каждого автора.
+
+    Один запрос на любое число авторов: посты нумеруются
+    ``ROW_NUMBER()`` внутри автора, и берутся первые номера.
+    """
+    ranked = Post.objects.filter(author_id__in=author_ids).order_by(
+    ).annotate(rank=Window(
+        RowNumber(), partition_by=[F('author_id')],
+        order_by=[F('pub_date').desc(), F('id').desc()],
+    )).values('id', 'author_id', 'pub_date', 'rank')
+    sql, params = ranked.query.sql_with_params()
+    return Post.objects.raw(
+        f'SELECT id, author_id, pub_date FROM ({sql}) WHERE rank <= %s '
+        f'ORDER BY author_id, rank',
+        (*params, settings.AUTHOR_RECENT_LENGTH))
+
+
+def forget_recent(author_id):
+    cache.delete(RECENT_KEY.format(author_id))
+
+
+def _split(keys, key):
+    """Граница ``key`` в списке ключей, отсортированном от новых к старым.
+
+    Возвращает ``(i, j)``: ключи новее ``key`` — ``keys[:i]``,
+    старше — ``keys[j:]``.
+    """
+    low, high = 0, len(keys)
+    while low < high:
+        middle = (low + high) // 2
+        if keys[middle] > key:
+            low = middle + 1
+        else:
+            high = middle
+    if low < len(keys) and keys[low] == key:
+        return low, low + 1
+    return low, low
+
+
+class MergePaginator(CursorPaginator):
+    """Лента подписок через k-way merge списков последних постов авторов.
+
+    Стоимость страницы зависит от её размера, а не от числа подписок:
+    куча держит по одному кандидату на автора, а в БД читаются только
+    посты итоговой страницы. Если страница уходит глубже, чем хранится
+    в кэше, она читается из ``object_list`` обычным keyset-запросом.
+    """
+
+    def __init__(self, author_ids, per_page, **kwargs):
+        self.author_ids = list(author_ids)
+        super().__init__(
+            Post.objects.filter(author_id__in=self.author_ids)
+            .select_related('author', 'group'),
+            per_page, **kwargs)
+
+    def fetch(self, direction, key, limit, offset=0):
+        streams, horizon = [], None
+        for keys in recent_keys(self.author_ids):
+            if len(keys) >= settings.AUTHOR_RECENT_LENGTH:
+                # Старше последнего ключа у автора могут быть посты,
+                # которых нет в кэше: ниже этой границы merge неточен.
+                horizon = max(horizon or keys[-1], keys[-1])
+            newer, older = _split(keys, key) if key else (0, 0)
+            if direction == FORWARD:
+                streams.append(islice(keys, older, None))
+            else:
+                streams.append(reversed(keys[:newer]))
+        if direction == FORWARD:
+            merged = heapq.merge(*streams, reverse=True)
+        else:
+            merged = heapq.merge(*streams)
+        picked = list(islice(merged, offset, offset + limit))
+        if horizon is not None and (
+                (direction == FORWARD and len(picked) < limit)
+                or (picked and min(picked) < horizon)
+                or (key is not None and key < horizon)):
+            return super().fetch(direction, key, limit, offset)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for _, pk in picked])
+        return [posts[pk] for _, pk in picked if pk in posts]
+
+
+def follow_page(request):
+    """Страница ленты «Избранные авторы» выбранным движком."""
+    if settings.FOLLOW_FEED_ENGINE == 'merge':
+        author_ids = Follow.objects.filter(
+            user=request.user).values_list('author_id', flat=True)
+        return paginate(request, author_ids, MergePaginator)
+    return paginate(request, timeline_for(request.user), TimelinePaginator)
+
+
+def follow_generation(request):
+    """Поколение страниц ленты подписок пользователя ``request``."""
+    return FOLLOW_GENERATION.format(request.user.pk)
+
+
+def invalidate(user_ids):
+    """Сбрасывает закэшированные ленты подписок пользователей."""
+    bump_generations(FOLLOW_GENERATION.format(user_id)
+                     for user_id in user_ids)
+
+
+def invalidate_followers(**lookup):
+    """Сбрасывает ленты тех, кто подписан на авторов по ``lookup``.
+
+    ``invalidate_followers(author_id=1)`` — подписчики автора,
+    ``invalidate_followers(author__posts__group=group)`` — подписчики
+    всех, кто писал в группу. Ленты остальных остаются в кэше.
+    """
+    invalidate(Follow.objects.filter(user__isnull=False, **lookup)
+               .values_list('user_id', flat=True).distinct())
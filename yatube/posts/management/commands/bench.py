@@ -0,0 +1,149 @@
+import json
+import time
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+URLCONFS = ('posts.urls', 'users.urls', 'about.urls')
+# GET по этим адресам меняет состояние: выход, подписка, отписка.
+SKIPPED = {'users:logout', 'posts:profile_follow', 'posts:profile_unfollow'}
+
+
+def percentile(samples, share):
+    """Процентиль по методу ближайшего ранга."""
+    ordered = sorted(samples)
+    rank = max(int(round(share * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку (p50/p95/p99), пропускную способность и число '
+        'запросов к БД для именованных адресов posts, users и about.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Запросов на каждый адрес.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--username',
+                            help='От чьего имени открывать страницы; по '
+                                 'умолчанию самый активный автор.')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кэш перед каждым запросом.')
+        parser.add_argument('--only', nargs='*', default=(),
+                            help='Имена адресов, например posts:index.')
+        parser.add_argument('--output', help='Куда сохранить JSON.')
+        parser.add_argument('--compare',
+                            help='JSON прошлого прогона для сравнения.')
+
+    def handle(self, *args, **options):
+        user = self.bench_user(options['username'])
+        client = Client()
+        client.force_login(user)
+        results = {}
+        for name, url in self.urls(user):
+            if options['only'] and name not in options['only']:
+                continue
+            results[name] = self.measure(client, url, options)
+            self.report(name, results[name])
+        if options['compare']:
+            self.compare(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({
+                    'started': timezone.now().isoformat(),
+                    'requests': options['requests'],
+                    'cold': options['cold'],
+                    'posts': Post.objects.count(),
+                    'results': results,
+                }, output, ensure_ascii=False, indent=2)
+
+    def bench_user(self, username):
+        if username:
+            return User.objects.get(username=username)
+        stats = User.objects.filter(stats__isnull=False).order_by(
+            '-stats__posts_count').first()
+        if stats is None:
+            raise CommandError('Нет данных: сначала запустите seed_data.')
+        return stats
+
+    def urls(self, user):
+        """Именованные адреса приложений с подставленными аргументами."""
+        post = Post.objects.filter(author=user).first()
+        group = Group.objects.filter(posts__isnull=False).first()
+        samples = {
+            'username': user.username,
+            'slug': group.slug if group else '',
+            'post_id': post.id if post else 0,
+        }
+        for urlconf in URLCONFS:
+            module = import_module(urlconf)
+            for pattern in module.urlpatterns:
+                if not isinstance(pattern, URLPattern) or not pattern.name:
+                    continue
+                kwargs = {key: samples[key]
+                          for key in pattern.pattern.converters}
+                name = f'{module.app_name}:{pattern.name}'
+                if name in SKIPPED:
+                    continue
+                yield name, reverse(name, kwargs=kwargs)
+
+    def measure(self, client, url, options):
+        for _ in range(options['warmup']):
+            client.get(url)
+        timings, queries, statuses = [], [], set()
+        started = time.perf_counter()
+        for _ in range(options['requests']):
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                begin = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - begin) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+        elapsed = time.perf_counter() - started
+        return {
+            'url': url,
+            'status': sorted(statuses),
+            'p50_ms': percentile(timings, 0.50),
+            'p95_ms': percentile(timings, 0.95),
+            'p99_ms': percentile(timings, 0.99),
+            'rps': options['requests'] / elapsed if elapsed else 0.0,
+            'queries': max(queries),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:28} p50 {result["p50_ms"]:8.2f} ms  '
+            f'p95 {result["p95_ms"]:8.2f} ms  '
+            f'p99 {result["p99_ms"]:8.2f} ms  '
+            f'{result["rps"]:8.1f} rps  {result["queries"]:3} sql'
+        )
+
+    def compare(self, results, path):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)['results']
+        self.stdout.write('\nИзменение p95 и числа запросов:')
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            change = (result['p95_ms'] / before['p95_ms'] - 1
+                      if before['p95_ms'] else 0.0)
+            self.stdout.write(
+                f'{name:28} p95 {change:+7.1%}  '
+                f'sql {before["queries"]} → {result["queries"]}'
+            )
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = 'Переносит комментарии из очереди в базу пачками.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Не выходить, сбрасывать очередь снова и '
+                                 'снова.')
+        parser.add_argument('--interval', type=float,
+                            default=settings.COMMENT_FLUSH_INTERVAL,
+                            help='Пауза между сбросами в секундах.')
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.COMMENT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        while True:
+            written = comment_queue.flush(options['batch_size'])
+            if written or not options['loop']:
+                self.stdout.write(f'Записано комментариев: {written}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Готовит миниатюры картинок из очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Не выходить, разбирать очередь снова и '
+                                 'снова.')
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Пауза между проходами в секундах.')
+
+    def handle(self, *args, **options):
+        while True:
+            done = thumbnails.drain()
+            if done or not options['loop']:
+                self.stdout.write(f'Готовы миниатюры картинок: {done}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
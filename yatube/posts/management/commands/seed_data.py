@@ -0,0 +1,190 @@
+import os
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from PIL import Image
+
+from posts.counters import recount
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'утро', 'город', 'река', 'поезд', 'книга', 'кофе', 'дождь', 'лес',
+    'песня', 'дорога', 'письмо', 'окно', 'море', 'снег', 'кот', 'мост',
+)
+# Комментарии к посту приходят в течение этого времени после него.
+COMMENT_WINDOW = timedelta(days=2)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочных замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=200000)
+        parser.add_argument('--follows', type=int, default=20000)
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой.')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа: чем больше, тем сильнее '
+                 'активность сосредоточена у немногих авторов и постов.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до сегодня разбросать даты постов.')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument(
+            '--password', default='benchmark',
+            help='Пароль всех созданных пользователей.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.now = timezone.now()
+        self.since = self.now - timedelta(days=options['days'])
+        prefix = f'seed{self.random.randrange(10 ** 6)}'
+        users = self.seed_users(prefix, options['users'],
+                                options['password'])
+        groups = self.seed_groups(prefix, options['groups'])
+        images = self.seed_images(prefix)
+        posts = self.seed_posts(prefix, options['posts'], users, groups,
+                                images, options['image_ratio'],
+                                options['skew'])
+        self.seed_comments(options['comments'], users, posts,
+                           options['skew'])
+        self.seed_follows(options['follows'], users, options['skew'])
+        recount()
+        call_command('rebuild_timelines', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Готово.'))
+
+    def zipf(self, population, skew, k):
+        """``k`` элементов с весами 1/rank**skew: у «звёзд» — львиная доля."""
+        weights = [1 / (rank ** skew)
+                   for rank in range(1, len(population) + 1)]
+        return self.random.choices(population, weights=weights, k=k)
+
+    def chunks(self, total):
+        for start in range(0, total, self.chunk_size):
+            yield start, min(self.chunk_size, total - start)
+
+    @staticmethod
+    def last_pk(model):
+        return model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+
+    def redate(self, queryset, field, date_of):
+        """Проставляет ``field`` строкам ``queryset`` по ``date_of(row)``.
+
+        ``auto_now_add`` ставит всем строкам ``bulk_create`` одно и то же
+        «сейчас»; без разброса дат ленты и индексы по дате замерялись бы
+        на сплошных совпадениях ключей.
+        """
+        rows = list(queryset.order_by('pk'))
+        for row in rows:
+            setattr(row, field, date_of(row))
+        queryset.model.objects.bulk_update(rows, [field])
+
+    def seed_users(self, prefix, count, password):
+        password = make_password(password)
+        for start, size in self.chunks(count):
+            User.objects.bulk_create(
+                User(username=f'{prefix}_{start + i}', password=password,
+                     first_name=self.random.choice(WORDS).title())
+                for i in range(size))
+        self.stdout.write(f'Пользователей: {count}')
+        return list(User.objects.filter(
+            username__startswith=prefix).values_list('id', flat=True))
+
+    def seed_groups(self, prefix, count):
+        Group.objects.bulk_create(
+            Group(title=f'Группа {i}', slug=f'{prefix}-{i}',
+                  description=self.text(20))
+            for i in range(count))
+        self.stdout.write(f'Групп: {count}')
+        return list(Group.objects.filter(
+            slug__startswith=prefix).values_list('id', flat=True))
+
+    def seed_images(self, prefix, count=8):
+        storage = Post._meta.get_field('image').storage
+        names = []
+        for i in range(count):
+            buffer = BytesIO()
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            Image.new('RGB', (1280, 720), color).save(buffer, 'JPEG')
+            names.append(storage.save(
+                os.path.join('posts', f'{prefix}_{i}.jpg'),
+                ContentFile(buffer.getvalue())))
+        return names
+
+    def seed_posts(self, prefix, count, users, groups, images, image_ratio,
+                   skew):
+        # Посты идут по времени в порядке id, как на живом сайте, и
+        # заканчиваются за COMMENT_WINDOW до «сейчас».
+        step = (self.now - COMMENT_WINDOW - self.since) / max(count, 1)
+        for start, size in self.chunks(count):
+            authors = self.zipf(users, skew, size)
+            last = self.last_pk(Post)
+            Post.objects.bulk_create(
+                Post(
+                    text=self.text(self.random.randint(5, 120)),
+                    author_id=author,
+                    group_id=(self.random.choice(groups)
+                              if groups and self.random.random() < 0.6
+                              else None),
+                    image=(self.random.choice(images)
+                           if self.random.random() < image_ratio else ''),
+                )
+                for author in authors)
+            dates = iter(sorted(
+                self.since + step * (start + self.random.random() * size)
+                for _ in range(size)))
+            self.redate(Post.objects.filter(pk__gt=last), 'pub_date',
+                        lambda post: next(dates))
+        self.stdout.write(f'Постов: {count}')
+        return dict(Post.objects.filter(
+            author__username__startswith=prefix).values_list('id', 'pub_date'))
+
+    def seed_comments(self, count, users, posts, skew):
+        if not posts:
+            return
+        # Свежие посты обсуждают больше старых.
+        dates, posts = posts, sorted(posts, reverse=True)
+        for _, size in self.chunks(count):
+            last = self.last_pk(Comment)
+            Comment.objects.bulk_create(
+                Comment(post_id=post, author_id=self.random.choice(users),
+                        text=self.text(self.random.randint(3, 40)))
+                for post in self.zipf(posts, skew, size))
+            self.redate(
+                Comment.objects.filter(pk__gt=last), 'created',
+                lambda comment: dates[comment.post_id]
+                + COMMENT_WINDOW * self.random.random())
+        self.stdout.write(f'Комментариев: {count}')
+
+    def seed_follows(self, count, users, skew):
+        for _, size in self.chunks(count):
+            pairs = ((self.random.choice(users), author)
+                     for author in self.zipf(users, skew, size))
+            Follow.objects.bulk_create(
+                (Follow(user_id=user, author_id=author)
+                 for user, author in pairs if user != author),
+                ignore_conflicts=True)
+        self.stdout.write(f'Подписок (с повторами): {count}')
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
@@ -0,0 +1,206 @@
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.models import Post
+
+LABELS = {
+    'sources': 'картинок без постов вместе с миниатюрами',
+    'originals': 'файлов картинок без постов',
+    'thumbnails': 'файлов миниатюр без записи sorl',
+    'temp_dirs': 'временных каталогов',
+}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def walk(root, directory):
+    """Файлы ``root/directory`` как ``(имя от root, mtime)``, без списков.
+
+    Обход идёт через ``os.scandir`` со стеком каталогов: в памяти только
+    текущий каталог, а не всё дерево.
+    """
+    stack = [os.path.join(root, directory)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, root)
+                    yield name.replace(os.sep, '/'), entry.stat().st_mtime
+
+
+def keyset(queryset, field, size):
+    """Значения ``field`` пачками по возрастанию, без открытого курсора.
+
+    Между пачками можно удалять строки той же таблицы: SQLite не
+    изолирует запросы одного соединения друг от друга.
+    """
+    last = None
+    while True:
+        page = queryset.order_by(field)
+        if last is not None:
+            page = page.filter(**{f'{field}__gt': last})
+        batch = list(page.values_list(field, flat=True)[:size])
+        if not batch:
+            return
+        yield batch
+        last = batch[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет картинки постов, на которые больше не ссылается ни один '
+        'пост, их миниатюры и миниатюры, забытые хранилищем sorl.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что было бы удалено.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Потоков для удаления файлов пачки.')
+        parser.add_argument('--rate', type=float, default=0,
+                            help='Не больше стольких удалений в секунду; '
+                                 '0 — без ограничения.')
+        parser.add_argument('--min-age', type=int, default=60 * 60,
+                            help='Не трогать файлы моложе стольких секунд: '
+                                 'пост для них может ещё сохраняться.')
+        parser.add_argument('--temp-dirs', action='store_true',
+                            help='Удалить и каталоги tmp* рядом с '
+                                 'manage.py, оставленные тестами.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.verbose = options['verbosity'] > 1
+        self.batch_size = options['batch_size']
+        self.rate = options['rate']
+        self.deadline = time.time() - options['min_age']
+        self.started = time.monotonic()
+        self.stats = Counter()
+        self.executor = ThreadPoolExecutor(max_workers=options['workers'])
+        with self.executor:
+            self.sweep_thumbnail_sources()
+            self.sweep_originals()
+            self.sweep_thumbnails()
+            if options['temp_dirs']:
+                self.sweep_temp_dirs()
+        verb = 'Нашлось бы' if self.dry_run else 'Удалено'
+        for kind, label in LABELS.items():
+            self.stdout.write(f'{verb} {label}: {self.stats[kind]}')
+
+    def referenced(self, names):
+        return set(Post.objects.filter(image__in=names).values_list(
+            'image', flat=True))
+
+    def throttle(self, count):
+        self.stats['deleted'] += count
+        if not self.rate:
+            return
+        ahead = (self.stats['deleted'] / self.rate
+                 - (time.monotonic() - self.started))
+        if ahead > 0:
+            time.sleep(ahead)
+
+    def remove(self, paths, kind):
+        paths = list(paths)
+        self.stats[kind] += len(paths)
+        if self.verbose:
+            for path in paths:
+                self.stdout.write(f'  {path}')
+        if self.dry_run or not paths:
+            return
+        list(self.executor.map(self._remove_file, paths))
+        self.throttle(len(paths))
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def sweep_thumbnail_sources(self):
+        """Миниатюры картинок, на которые не ссылается ни один пост."""
+        prefix = add_prefix('', 'thumbnails')
+        entries = KVStoreModel.objects.filter(key__startswith=prefix)
+        for keys in keyset(entries, 'key', self.batch_size):
+            sources = [
+                deserialize_image_file(value)
+                for value in KVStoreModel.objects.filter(
+                    key__in=[add_prefix(del_prefix(key)) for key in keys]
+                ).values_list('value', flat=True)
+            ]
+            referenced = self.referenced([
+                source.name for source in sources])
+            stale = [source for source in sources
+                     if source.name not in referenced]
+            self.stats['sources'] += len(stale)
+            if self.dry_run:
+                continue
+            for source in stale:
+                default.kvstore.delete(source)
+            self.throttle(len(stale))
+
+    def sweep_originals(self):
+        """Картинки в ``posts/`` без постов и недописанные загрузки."""
+        root = settings.MEDIA_ROOT
+        files = ((name, mtime) for name, mtime in walk(root, 'posts')
+                 if mtime < self.deadline)
+        for batch in batched(files, self.batch_size):
+            names = [name for name, _ in batch]
+            referenced = self.referenced(names)
+            orphans = [name for name in names if name not in referenced]
+            self.remove((os.path.join(root, name) for name in orphans),
+                        'originals')
+
+    def sweep_thumbnails(self):
+        """Файлы миниатюр, о которых не знает хранилище ключей sorl."""
+        root = settings.MEDIA_ROOT
+        files = ((name, mtime) for name, mtime in walk(
+            root, thumbnail_settings.THUMBNAIL_PREFIX)
+            if mtime < self.deadline)
+        for batch in batched(files, self.batch_size):
+            keys = {add_prefix(ImageFile(name, default.storage).key): name
+                    for name, _ in batch}
+            known = set(KVStoreModel.objects.filter(
+                key__in=list(keys)).values_list('key', flat=True))
+            self.remove((os.path.join(root, name)
+                         for key, name in keys.items() if key not in known),
+                        'thumbnails')
+
+    def sweep_temp_dirs(self):
+        base = settings.BASE_DIR
+        with os.scandir(base) as entries:
+            stale = [entry.path for entry in entries
+                     if entry.name.startswith('tmp') and entry.is_dir()
+                     and entry.stat().st_mtime < self.deadline]
+        self.stats['temp_dirs'] += len(stale)
+        if self.dry_run:
+            return
+        for path in stale:
+            shutil.rmtree(path, ignore_errors=True)
+        self.throttle(len(stale))
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Обрезает ленты «Избранные авторы», переросшие TIMELINE_LENGTH '
+        'больше чем на TIMELINE_SLACK записей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Не выходить, обрезать ленты снова и '
+                                 'снова.')
+        parser.add_argument('--interval', type=float,
+                            default=settings.TIMELINE_TRIM_INTERVAL,
+                            help='Пауза между проходами в секундах.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Пользователей на один проход запросов.')
+
+    def handle(self, *args, **options):
+        while True:
+            trimmed = feeds.trim_all(options['batch_size'])
+            if trimmed or not options['loop']:
+                self.stdout.write(f'Обрезано лент: {trimmed}')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
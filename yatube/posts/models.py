@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import models
 
+from .storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
@@ -39,8 +41,19 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='комментариев'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='версия'
+    )
 
     def __str__(self):
         return self.text[:15]
@@ -50,6 +63,13 @@ class Post(models.Model):
         verbose_name_plural = 'Посты'
         default_related_name = 'posts'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(fields=['author', 'pub_date'],
+                         name='post_author_date_idx'),
+            models.Index(fields=['group', 'pub_date'],
+                         name='post_group_date_idx'),
+        ]
 
 
 class Comment(models.Model, LoginRequiredMixin):
@@ -64,10 +84,17 @@ class Comment(models.Model, LoginRequiredMixin):
     )
     text = models.TextField(verbose_name='Текст')
     created = models.DateTimeField(auto_now_add=True)
+    # Ключ комментария в очереди comment_queue: пачку, записанную, но не
+    # удалённую из очереди, повторный flush пропускает.
+    queue_key = models.UUIDField(null=True, unique=True, editable=False)
 
     class Meta:
         ordering = ('created',)
         verbose_name_plural = 'Коментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -84,3 +111,44 @@ class Follow(models.Model):
 
     class Meta:
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='unique_follow'),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT(*)."""
+    user = models.OneToOneField(User,
+                                on_delete=models.CASCADE,
+                                primary_key=True,
+                                related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0,
+                                              verbose_name='постов')
+    followers_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  verbose_name='подписок')
+
+    class Meta:
+        verbose_name_plural = 'Счётчики авторов'
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты «Избранные авторы», разложенная при публикации поста."""
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    pub_date = models.DateTimeField(verbose_name='Дата')
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        verbose_name_plural = 'Ленты подписок'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post'],
+                         name='timeline_user_date_idx'),
+        ]
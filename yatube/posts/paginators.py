@@ -0,0 +1,306 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.paginator import (
+    EmptyPage, Page, PageNotAnInteger, Paginator,
+)
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core.cache import get_or_rebuild
+
+from .models import Comment
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+def encode_cursor(direction, number, key):
+    """Упаковывает позицию в ленте в непрозрачный токен."""
+    date, pk = key
+    raw = '|'.join((direction, str(number), date.isoformat(), str(pk)))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен; для испорченного токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, number, date, pk = raw.split('|')
+        number, pk, date = int(number), int(pk), parse_datetime(date)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (FORWARD, BACKWARD) or number < 1 or date is None:
+        return None
+    return direction, number, (date, pk)
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинатор по паре ``(pub_date, id)``.
+
+    Страница выбирается условием на ключ последней показанной записи,
+    а не ``OFFSET``, и без ``COUNT(*)``: любая страница стоит столько же,
+    сколько первая. Пагинатор обслуживает ровно одну страницу, поэтому
+    ``num_pages`` известен только относительно неё — этого хватает
+    методам ``Page.has_next``/``has_previous``. С ``oldest_first`` лента
+    идёт от старых записей к новым.
+    """
+
+    date_field = 'pub_date'
+    id_field = 'id'
+
+    def __init__(self, object_list, per_page, oldest_first=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.oldest_first = oldest_first
+        self.next_cursor = None
+        self.previous_cursor = None
+        self._num_pages = 1
+
+    @property
+    def num_pages(self):
+        return self._num_pages
+
+    @property
+    def page_range(self):
+        return range(1, self._num_pages + 1)
+
+    def validate_number(self, number):
+        return number
+
+    def key(self, obj):
+        return getattr(obj, self.date_field), getattr(obj, self.id_field)
+
+    def fetch(self, direction, key, limit, offset=0):
+        """Возвращает ``limit`` записей после (или до) ключа ``key``.
+
+        Записи отдаются в порядке обхода: для ``BACKWARD`` — от старых
+        к новым. Наследники переопределяют метод, чтобы читать ленту
+        не из ``object_list``.
+        """
+        date, pk = self.date_field, self.id_field
+        queryset = self.object_list
+        if (direction == FORWARD) != self.oldest_first:
+            ordering = ('-' + date, '-' + pk)
+            if key is not None:
+                queryset = queryset.filter(
+                    Q(**{date + '__lte': key[0]}),
+                    Q(**{date + '__lt': key[0]}) | Q(**{pk + '__lt': key[1]}),
+                )
+        else:
+            ordering = (date, pk)
+            if key is not None:
+                queryset = queryset.filter(
+                    Q(**{date + '__gte': key[0]}),
+                    Q(**{date + '__gt': key[0]}) | Q(**{pk + '__gt': key[1]}),
+                )
+        return list(queryset.order_by(*ordering)[offset:offset + limit])
+
+    def get_cursor_page(self, cursor=None):
+        """Страница по токену; пустой или испорченный токен — первая."""
+        state = decode_cursor(cursor) if cursor else None
+        if state is None:
+            return self._build_page(FORWARD, 1, None)
+        direction, number, key = state
+        return self._build_page(direction, number, key)
+
+    def get_page(self, number):
+        """Совместимость со ссылками вида ``?page=N``.
+
+        Такие страницы читаются через ``OFFSET``, но переходы с них
+        дальше уже идут по курсорам.
+        """
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        return self._build_page(
+            FORWARD, number, None, offset=(number - 1) * self.per_page
+        )
+
+    def page(self, number):
+        return self.get_page(number)
+
+    def _build_page(self, direction, number, key, offset=0):
+        rows = self.fetch(direction, key, self.per_page + 1, offset)
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == FORWARD:
+            has_previous = number > 1
+            has_next = more
+        else:
+            if not more:
+                # Дошли до начала ленты: это первая страница, и читать её
+                # надо заново, иначе она окажется неполной.
+                return self._build_page(FORWARD, 1, None)
+            rows.reverse()
+            has_previous = has_next = True
+            number = max(number, 2)
+        if rows and has_next:
+            self.next_cursor = encode_cursor(
+                FORWARD, number + 1, self.key(rows[-1])
+            )
+        if rows and has_previous:
+            self.previous_cursor = encode_cursor(
+                BACKWARD, number - 1, self.key(rows[0])
+            )
+        self._num_pages = number + 1 if has_next else number
+        return Page(rows, number, self)
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста порциями по ``(created, id)``."""
+
+    date_field = 'created'
+
+
+def comment_page(request, post_id):
+    """Порция комментариев поста вместе с авторами, одним запросом.
+
+    По умолчанию — от старых к новым, ``?order=newest`` — наоборот;
+    следующую порцию выбирает ``?cursor=``.
+    """
+    paginator = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        settings.COMMENTS_PER_PAGE,
+        oldest_first=request.GET.get('order') != 'newest')
+    return paginator.get_cursor_page(request.GET.get('cursor'))
+
+
+class ElidedPaginator(Paginator):
+    """Нумерованный пагинатор для огромных лент.
+
+    Ссылки даются только на окно страниц вокруг текущей плюс первую
+    и последнюю, а общее число записей можно передать готовым
+    (``count=`` — число или функция), не считая его ``COUNT(*)``.
+    """
+
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self._count = count
+
+    @cached_property
+    def count(self):
+        if self._count is None:
+            return super().count
+        return self._count() if callable(self._count) else self._count
+
+    def validate_number(self, number):
+        # Номер не сверяется с оценкой числа страниц: она может быть
+        # занижена, а дальше страницы уточняет сам ``page``.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не целое число')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def get_page(self, number):
+        try:
+            return self.page(number)
+        except (PageNotAnInteger, EmptyPage):
+            return self.page(1)
+
+    def page(self, number):
+        """Страница ``number`` и уточнённые по ней ``count`` и ``num_pages``.
+
+        Читается на одну запись больше страницы: если она нашлась, за
+        страницей есть ещё, сколько бы ни обещала оценка; если страница
+        неполная, она последняя. Вместо пустой страницы за концом ленты
+        отдаётся последняя непустая.
+        """
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and number > 1:
+            # Номер за концом ленты: ссылка с завышенной оценкой или
+            # набранная вручную. Как и ``Paginator.get_page``, отдаём
+            # последнюю страницу, а её номер — по точному счёту.
+            last = Paginator(self.object_list, self.per_page).num_pages
+            return self.page(min(last, number - 1))
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            self.count = max(self.count, bottom + self.per_page + 1)
+            self.num_pages = max(self.num_pages, number + 1)
+        else:
+            self.count = bottom + len(rows)
+            self.num_pages = number
+        page = self._get_page(rows, number, self)
+        page.elided_page_range = list(self.get_elided_page_range(number))
+        return page
+
+    def get_elided_page_range(self, number=1, on_each_side=2, on_ends=1):
+        """Номера страниц с ``ELLIPSIS`` вместо пропущенных участков."""
+        last = self.num_pages
+        if last <= (on_each_side + on_ends) * 2 + 1:
+            yield from range(1, last + 1)
+            return
+        if number > on_each_side + on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < last - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(last - on_ends + 1, last + 1)
+        else:
+            yield from range(number + 1, last + 1)
+
+
+def cached_count(queryset, key):
+    """Точный ``COUNT(*)``, пересчитываемый не чаще ``COUNT_CACHE_TIMEOUT``.
+
+    Пересчёт делает один запрос, остальные тем временем берут прежнее
+    значение.
+    """
+    return get_or_rebuild(f'count:{key}', queryset.count,
+                          settings.COUNT_CACHE_HARD_TIMEOUT,
+                          settings.COUNT_CACHE_TIMEOUT)
+
+
+def estimated_count(model):
+    """Примерное число строк таблицы из статистики ``ANALYZE``.
+
+    Первое число в ``sqlite_stat1.stat`` — размер таблицы. Без собранной
+    статистики (или не на SQLite) берётся закэшированный точный счёт.
+    """
+    table = model._meta.db_table
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                    [table])
+                row = cursor.fetchone()
+        except DatabaseError:
+            row = None
+        if row:
+            return int(row[0].split()[0])
+    return cached_count(model._default_manager.all(), table)
+
+
+def paginate(request, object_list, paginator_class=CursorPaginator,
+             count=None):
+    """Страница ленты для запроса.
+
+    В режиме ``FEED_PAGINATION = 'numbered'`` ленты, для которых известна
+    оценка ``count``, листаются по номерам страниц; иначе — курсорами
+    (``?cursor=`` или старые ссылки ``?page=``).
+    """
+    page_number = request.GET.get('page')
+    if settings.FEED_PAGINATION == 'numbered' and count is not None:
+        paginator = ElidedPaginator(object_list, settings.VAR_LIMITER,
+                                    count=count)
+        return paginator.get_page(page_number)
+    paginator = paginator_class(object_list, settings.VAR_LIMITER)
+    if page_number is not None and 'cursor' not in request.GET:
+        return paginator.get_page(page_number)
+    return paginator.get_cursor_page(request.GET.get('cursor'))
@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.cache import bump_generation
+
+from . import counters, feeds, summaries
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+CARD_FIELDS = {'username', 'first_name', 'last_name'}
+
+# Посты, которые сейчас удаляются вместе с комментариями.
+_deleting_posts = set()
+
+
+def bump_versions(posts):
+    """Сдвигает версии постов, чтобы сбросить их кэшированные карточки."""
+    posts.update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    bump_generation('feed')
+    feeds.invalidate_followers(author_id=instance.author_id)
+    if not created:
+        bump_versions(Post.objects.filter(pk=instance.pk))
+        instance.version += 1
+        return
+    counters.bump_author(instance.author_id, posts_count=1)
+    feeds.forget_recent(instance.author_id)
+    if settings.FOLLOW_FEED_ENGINE == 'timeline':
+        feeds.fan_out(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Каскад шлёт post_delete на каждый комментарий раньше, чем на сам
+    # пост; считать их и сбрасывать сводки удаляемого поста незачем.
+    _deleting_posts.add(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    _deleting_posts.discard(instance.pk)
+    bump_generation('feed')
+    feeds.invalidate_followers(author_id=instance.author_id)
+    counters.bump_author(instance.author_id, create=False, posts_count=-1)
+    feeds.forget_recent(instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.bump_post(instance.post_id, 1)
+        summaries.invalidate([instance.post_id])
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id in _deleting_posts:
+        return
+    counters.bump_post(instance.post_id, -1)
+    # Заодно сдвигается и Last-Modified страницы поста: время удаления
+    # нигде больше не остаётся.
+    summaries.invalidate([instance.post_id])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if not (created and instance.user_id and instance.author_id):
+        return
+    counters.bump_author(instance.author_id, followers_count=1)
+    counters.bump_author(instance.user_id, following_count=1)
+    feeds.invalidate([instance.user_id])
+    if settings.FOLLOW_FEED_ENGINE == 'timeline':
+        feeds.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if not (instance.user_id and instance.author_id):
+        return
+    counters.bump_author(instance.author_id, create=False,
+                         followers_count=-1)
+    counters.bump_author(instance.user_id, create=False, following_count=-1)
+    feeds.invalidate([instance.user_id])
+    if settings.FOLLOW_FEED_ENGINE == 'timeline':
+        feeds.drop(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        bump_versions(instance.posts.all())
+        bump_generation('feed')
+        feeds.invalidate_followers(author__posts__group=instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and not CARD_FIELDS & set(update_fields)):
+        return
+    bump_versions(Post.objects.filter(author=instance))
+    bump_generation('feed')
+    feeds.invalidate_followers(author_id=instance.pk)
+    # Имя могло стоять под последним комментарием в сводках.
+    summaries.invalidate(instance.comments.values_list(
+        'post_id', flat=True).distinct())
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # Страницы кэшируются по id пользователя, а SQLite может отдать этот
+    # id новому пользователю.
+    bump_generation('feed')
+    feeds.invalidate([instance.pk])
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором файл лежит под SHA-256 своего содержимого.
+
+    Загрузка пишется на диск кусками во временный файл, попутно
+    считается хэш. Если такой файл уже есть, временный удаляется, и
+    новый пост ссылается на старый файл: одинаковые картинки хранятся
+    один раз, и миниатюры у них тоже общие. Каталог из ``upload_to`` и
+    расширение исходного имени сохраняются: ``posts/ab/ab12….jpg``.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя выбирает _save по содержимому, занятость старого не важна.
+        return name
+
+    def _save(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(
+            dir=self.path(directory), suffix='.part')
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(descriptor, 'wb') as output:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    output.write(chunk)
+            digest = digest.hexdigest()
+            name = posixpath.join(directory, digest[:2], digest + extension)
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if os.path.exists(path):
+                os.remove(temporary)
+                # Свежее время изменения не даёт sweep_media --min-age
+                # удалить файл, пока пост со ссылкой на него не записан.
+                os.utime(path)
+            else:
+                if self.file_permissions_mode is not None:
+                    os.chmod(temporary, self.file_permissions_mode)
+                os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        return name
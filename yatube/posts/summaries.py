@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from core.cache import bump_generation
+from core.holes import prefetcher
+
+from .models import Comment, Post
+
+SUMMARY_KEY = 'posts:comments:{}'
+TEMPLATE = 'posts/includes/comment_summary.html'
+
+
+def load(post_ids):
+    """Сводки ``{post_id: {'count', 'author', 'text'}}`` из базы.
+
+    Один запрос на все посты: последний комментарий каждого находится по
+    индексу ``(post, created)``.
+    """
+    latest = Comment.objects.filter(post=OuterRef('pk')).order_by(
+        '-created', '-pk')
+    rows = Post.objects.filter(pk__in=post_ids).order_by().annotate(
+        latest_author=Subquery(latest.values('author__username')[:1]),
+        latest_text=Subquery(latest.values('text')[:1]),
+    ).values_list('pk', 'comments_count', 'latest_author', 'latest_text')
+    return {pk: {'count': count, 'author': author, 'text': text}
+            for pk, count, author, text in rows}
+
+
+def get_many(post_ids):
+    """Сводки комментариев постов: из кэша, недостающие — из ``load``."""
+    keys = {SUMMARY_KEY.format(post_id): post_id for post_id in post_ids}
+    found = cache.get_many(list(keys))
+    summaries = {keys[key]: summary for key, summary in found.items()}
+    missing = [post_id for key, post_id in keys.items() if key not in found]
+    if missing:
+        loaded = load(missing)
+        cache.set_many({SUMMARY_KEY.format(post_id): summary
+                        for post_id, summary in loaded.items()},
+                       settings.COMMENT_SUMMARY_TIMEOUT)
+        summaries.update(loaded)
+    return summaries
+
+
+def invalidate(post_ids):
+    """Забывает сводки постов, у которых изменились комментарии.
+
+    Страницы со сводками при этом остаются в кэше: сводка в них —
+    ``{% hole %}``. Поколение 'comments' сдвигается только ради ETag и
+    Last-Modified лент, по нему страницы не кэшируются.
+    """
+    cache.delete_many([SUMMARY_KEY.format(post_id) for post_id in post_ids])
+    bump_generation('comments')
+
+
+@prefetcher(TEMPLATE)
+def _prefetch(request, holes):
+    summaries = get_many({values['post_id'] for values in holes})
+    for values in holes:
+        values['summary'] = summaries.get(values['post_id'])
@@ -0,0 +1,99 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import prefetch_thumbnails
+
+register = template.Library()
+
+CARD_KEY = 'posts:card:{}:{}:{}'
+HITS_KEY = 'posts:card:hits'
+MISSES_KEY = 'posts:card:misses'
+
+
+def _count(key, delta=1):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, None):
+            cache.incr(key, delta)
+
+
+def _key(post):
+    return CARD_KEY.format(post.pk, post.version, post.pub_date.timestamp())
+
+
+def _render(post):
+    return render_to_string('includes/common_in_post.html', {'post': post})
+
+
+def card_stats():
+    """Попадания и промахи кэша карточек с момента последнего сброса."""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'ratio': hits / total if total else 0.0,
+    }
+
+
+def reset_card_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+@register.simple_tag
+def prefetch_cards(posts):
+    """Готовит карточки всей страницы до цикла по ней.
+
+    Карточки читаются одним ``get_many``, миниатюры для промахов — одной
+    пачкой через ``prefetch_thumbnails``, новые карточки пишутся одним
+    ``set_many``. Результат запоминается в ``post.card_html``, его и
+    выводит ``post_card``.
+
+    Число комментариев и последний из них в карточку не входят, иначе
+    каждый комментарий сбрасывал бы её: их рисует фрагмент
+    ``posts/includes/comment_summary.html`` рядом с карточкой.
+    """
+    keys = {_key(post): post for post in posts}
+    cached = cache.get_many(list(keys))
+    prefetch_thumbnails(
+        post for key, post in keys.items() if key not in cached)
+    fresh = {}
+    for key, post in keys.items():
+        if key not in cached:
+            fresh[key] = _render(post)
+        post.card_html = cached.get(key, fresh.get(key))
+    if fresh:
+        cache.set_many(fresh, settings.POST_CARD_TIMEOUT)
+    _count(HITS_KEY, len(cached))
+    _count(MISSES_KEY, len(fresh))
+    return ''
+
+
+@register.simple_tag
+def post_card(post):
+    """Карточка поста из ``includes/common_in_post.html`` через кэш.
+
+    Ключ — id и версия поста: правка поста, смена группы или имени
+    автора увеличивают версию, и старая карточка просто перестаёт
+    читаться. Дата публикации в ключе нужна потому, что SQLite отдаёт
+    id удалённого последним поста новому посту.
+    """
+    html = getattr(post, 'card_html', None)
+    if html is not None:
+        return mark_safe(html)
+    key = _key(post)
+    html = cache.get(key)
+    if html is None:
+        _count(MISSES_KEY)
+        html = _render(post)
+        cache.set(key, html, settings.POST_CARD_TIMEOUT)
+    else:
+        _count(HITS_KEY)
+    return mark_safe(html)
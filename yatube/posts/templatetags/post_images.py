@@ -0,0 +1,45 @@
+from django import template
+from sorl.thumbnail import default
+
+from posts.thumbnails import (
+    DEFAULT_WIDTH, MIME_TYPES, VARIANTS, prefetch_thumbnails,
+)
+
+register = template.Library()
+
+SIZES = f'(max-width: {DEFAULT_WIDTH}px) 100vw, {DEFAULT_WIDTH}px'
+
+
+def _srcset(thumbnails):
+    return ', '.join(f'{thumbnail.url} {width}w'
+                     for width, thumbnail in thumbnails)
+
+
+@register.inclusion_tag('includes/picture.html')
+def post_picture(post):
+    """Картинка поста в ``<picture>``: srcset по ширинам и форматам.
+
+    Браузер сам выбирает формат (AVIF, WebP, если их умеет Pillow
+    сервера, иначе JPEG) и ширину под экран. Пока запасная миниатюра
+    не готова, выводится заглушка.
+    """
+    if not post.image:
+        return {}
+    if not hasattr(post.image, 'prefetched_thumbnails'):
+        prefetch_thumbnails([post])
+    ready = {}
+    for format_, width, geometry, options in VARIANTS:
+        thumbnail = default.backend.get_thumbnail(
+            post.image, geometry, **options)
+        if thumbnail:
+            ready.setdefault(format_, []).append((width, thumbnail))
+    fallback = dict(ready.pop(None, ()))
+    if DEFAULT_WIDTH not in fallback:
+        return {'placeholder': True}
+    return {
+        'image': fallback[DEFAULT_WIDTH],
+        'srcset': _srcset(sorted(fallback.items())),
+        'sources': [(MIME_TYPES[format_], _srcset(thumbnails))
+                    for format_, thumbnails in ready.items()],
+        'sizes': SIZES,
+    }
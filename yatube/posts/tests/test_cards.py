@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Group, Post
+from posts.summaries import get_many
+from posts.templatetags.post_cards import card_stats
+
+from core.cache import bump_generation
+
+User = get_user_model()
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author',
+                                              first_name='Лев')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Текст', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def profile(self):
+        # Страница профиля закэширована целиком; карточки проверяются
+        # при её пересборке.
+        bump_generation('feed')
+        return self.client.get(
+            reverse('posts:profile', kwargs={'username': 'author'}))
+
+    def test_second_render_hits_cache(self):
+        self.profile()
+        self.profile()
+        self.assertEqual(card_stats()['misses'], 1)
+        self.assertEqual(card_stats()['hits'], 1)
+        self.assertEqual(card_stats()['ratio'], 0.5)
+
+    def test_post_edit_bumps_version(self):
+        self.profile()
+        self.client.post(
+            reverse('posts:post_edit', args=[self.post.id]),
+            {'text': 'Новый текст'})
+        self.assertContains(self.profile(), 'Новый текст')
+
+    def test_author_rename_bumps_version(self):
+        self.assertContains(self.profile(), 'Лев')
+        self.author.first_name = 'Фёдор'
+        self.author.save()
+        self.assertContains(self.profile(), 'Фёдор')
+
+    def test_group_change_bumps_version(self):
+        version = Post.objects.get(pk=self.post.pk).version
+        self.group.title = 'Новая группа'
+        self.group.save()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version,
+                         version + 1)
+
+    def test_comment_summary_is_outside_card(self):
+        self.profile()
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Первый')
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Свежий ответ')
+        # Страница остаётся в кэше: сводка под карточкой — фрагмент.
+        with self.assertNumQueries(4):
+            response = self.client.get(
+                reverse('posts:profile', kwargs={'username': 'author'}))
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Комментариев: 2')
+        self.assertContains(response, 'author: Свежий ответ')
+        self.assertNotContains(response, 'Первый')
+        self.assertEqual(card_stats()['misses'], 1)
+
+    def test_summaries_in_one_query(self):
+        posts = [self.post]
+        for i in range(5):
+            post = Post.objects.create(text=f'Пост {i}', author=self.author)
+            Comment.objects.create(post=post, author=self.author,
+                                   text=f'к посту {post.pk}')
+            posts.append(post)
+        with self.assertNumQueries(1):
+            summaries = get_many([post.pk for post in posts])
+        self.assertEqual(summaries[self.post.pk],
+                         {'count': 0, 'author': None, 'text': None})
+        for post in posts[1:]:
+            self.assertEqual(summaries[post.pk], {
+                'count': 1, 'author': 'author', 'text': f'к посту {post.pk}'})
+        with self.assertNumQueries(0):
+            get_many([post.pk for post in posts])
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Новый')
+        with self.assertNumQueries(1):
+            self.assertEqual(get_many([post.pk for post in posts])[
+                self.post.pk]['text'], 'Новый')
@@ -0,0 +1,58 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from posts.models import AuthorStats, Comment, Post
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchCommandsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_data_then_bench(self):
+        call_command('seed_data', users=5, groups=2, posts=40, comments=30,
+                     follows=10, seed=1, chunk_size=16,
+                     stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 30)
+        top = AuthorStats.objects.order_by('-posts_count').first()
+        self.assertEqual(top.posts_count,
+                         Post.objects.filter(author_id=top.user_id).count())
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+        self.assertEqual(len(set(dates)), 40)
+        self.assertGreater(dates[-1] - dates[0], timedelta(days=300))
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')).exists())
+        self.assertFalse(Comment.objects.filter(
+            created__gt=timezone.now()).exists())
+
+        output = os.path.join(TEMP_MEDIA_ROOT, 'bench.json')
+        call_command('bench', requests=3, warmup=1, output=output,
+                     stdout=StringIO())
+        with open(output) as report_file:
+            results = json.load(report_file)['results']
+        self.assertIn('posts:index', results)
+        self.assertNotIn('users:logout', results)
+        index = results['posts:index']
+        self.assertEqual(index['status'], [200])
+        self.assertLessEqual(index['p50_ms'], index['p99_ms'])
+
+        compared = StringIO()
+        call_command('bench', requests=2, warmup=0, compare=output,
+                     only=['posts:index'], stdout=compared)
+        self.assertIn('p95', compared.getvalue())
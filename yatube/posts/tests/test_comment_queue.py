@@ -0,0 +1,125 @@
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from posts import comment_queue
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+QUEUE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(COMMENT_INGEST='queued', COMMENT_FLUSH_INTERVAL=60,
+                   COMMENT_QUEUE_PATH=f'{QUEUE_DIR}/queue.sqlite3')
+class CommentQueueTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='queue')
+        cls.post = Post.objects.create(text='пост', author=cls.author)
+        cls.other = Post.objects.create(text='другой', author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(QUEUE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        comment_queue.connection().execute('DELETE FROM queue')
+        self.client.force_login(self.author)
+
+    def comment(self, post, text='комментарий'):
+        return self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.id}),
+            {'text': text})
+
+    def test_comment_waits_in_queue_until_flush(self):
+        response = self.comment(self.post)
+        self.assertRedirects(response, reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.id}))
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(self.post.comments.get().text, 'комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(comment_queue.flush(), 0)
+
+    def test_flush_writes_batches_and_bumps_counters(self):
+        for i in range(5):
+            comment_queue.push(self.post.id, self.author.id, f'к{i}')
+        comment_queue.push(self.other.id, self.author.id, 'к')
+        # На пачку: посты, авторы, SAVEPOINT, уже записанные ключи,
+        # INSERT, id записанных, UPDATE их дат, по UPDATE на пост и
+        # RELEASE.
+        with self.assertNumQueries(9 + 9 + 10):
+            self.assertEqual(comment_queue.flush(batch_size=2), 6)
+        self.assertEqual(
+            list(self.post.comments.values_list('text', flat=True)),
+            [f'к{i}' for i in range(5)])
+        self.post.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 5)
+        self.assertEqual(self.other.comments_count, 1)
+        self.assertIsNone(comment_queue.oldest_age())
+
+    def test_comments_to_missing_posts_are_dropped(self):
+        comment_queue.push(self.post.id, self.author.id, 'есть')
+        comment_queue.push(0, self.author.id, 'нет поста')
+        comment_queue.push(self.post.id, 0, 'нет автора')
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertIsNone(comment_queue.oldest_age())
+
+    def test_replayed_batch_is_not_written_twice(self):
+        comment_queue.push(self.post.id, self.author.id, 'один раз')
+        rows = comment_queue._claim(10)[1]
+        # Воркер записал пачку и упал, не удалив её из очереди.
+        self.assertEqual(comment_queue._write(rows), 1)
+        comment_queue.connection().execute(
+            'UPDATE queue SET claimed = ?',
+            (time.time() - comment_queue.CLAIM_TIMEOUT - 1,))
+        self.assertEqual(comment_queue.flush(), 0)
+        self.assertEqual(self.post.comments.count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertIsNone(comment_queue.oldest_age())
+
+    def test_comment_keeps_submission_time(self):
+        comment_queue.push(self.post.id, self.author.id, 'давний')
+        comment_queue.connection().execute(
+            'UPDATE queue SET queued = queued - 3600')
+        comment_queue.flush()
+        age = timezone.now() - self.post.comments.get().created
+        self.assertGreater(age, timedelta(minutes=59))
+        self.assertLess(age, timedelta(minutes=61))
+
+    def test_abandoned_claim_is_taken_over(self):
+        comment_queue.push(self.post.id, self.author.id, 'брошенный')
+        comment_queue._claim(10)
+        self.assertEqual(comment_queue.flush(), 0)
+        comment_queue.connection().execute(
+            'UPDATE queue SET claimed = ?',
+            (time.time() - comment_queue.CLAIM_TIMEOUT - 1,))
+        self.assertEqual(comment_queue.flush(), 1)
+
+    def test_request_flushes_overdue_queue(self):
+        self.comment(self.post)
+        self.assertFalse(Comment.objects.exists())
+        with override_settings(COMMENT_FLUSH_INTERVAL=0):
+            self.client.get(reverse('posts:index'))
+        self.assertTrue(self.post.comments.exists())
+
+    def test_flush_comments_command(self):
+        comment_queue.push(self.post.id, self.author.id, 'к')
+        output = StringIO()
+        call_command('flush_comments', stdout=output)
+        self.assertIn('1', output.getvalue())
+        self.assertTrue(self.post.comments.exists())
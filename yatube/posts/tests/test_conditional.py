@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+from core.cache import LOCK_KEY, page_key
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Пост', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_feeds_answer_304_without_queries(self):
+        for url in (reverse('posts:index'),
+                    reverse('posts:group_list', args=['group'])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('no-cache', response['Cache-Control'])
+                with self.assertNumQueries(0):
+                    self.assertEqual(
+                        self.revalidate(url, response).status_code, 304)
+                self.assertEqual(self.client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+                ).status_code, 304)
+
+    def test_new_post_changes_feed_etag(self):
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        Post.objects.create(text='Второй', author=self.author)
+        self.assertContains(self.revalidate(url, response), 'Второй')
+
+    def test_new_comment_changes_feed_etag(self):
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        Comment.objects.create(post=self.post, author=self.author,
+                               text='Ответ')
+        self.assertContains(self.revalidate(url, response), 'Комментариев: 1')
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        self.client.force_login(self.reader)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_post_detail_follows_version_and_comments(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        response = self.revalidate(url, response)
+        self.assertContains(response, 'Комментарий')
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        self.post.text = 'Правка'
+        self.post.save()
+        self.assertContains(self.revalidate(url, response), 'Правка')
+
+    def test_profile_follows_subscription(self):
+        url = reverse('posts:profile', args=['author'])
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_missing_pages_are_not_validated(self):
+        response = self.client.get(reverse('posts:post_detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('ETag', response)
+
+    def test_stale_copy_has_no_validators(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        cache.add(LOCK_KEY.format(page_key(request, 'feed')), 1)
+        Post.objects.create(text='Второй', author=self.author)
+        response = self.client.get(url)
+        self.assertNotContains(response, 'Второй')
+        self.assertNotIn('ETag', response)
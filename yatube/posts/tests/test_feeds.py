@@ -0,0 +1,193 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.feeds import MergePaginator, recent_keys
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='writer')
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.reader).values_list('post_id', flat=True))
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self.timeline(), [post.id])
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_follow_and_unfollow_update_timeline(self):
+        old = Post.objects.create(text='Старый пост', author=self.author)
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': 'writer'}))
+        self.assertEqual(self.timeline(), [old.id])
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': 'writer'}))
+        self.assertEqual(self.timeline(), [])
+
+    def test_deleted_post_leaves_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        post.delete()
+        self.assertEqual(self.timeline(), [])
+
+    def trim(self):
+        call_command('trim_timelines', stdout=StringIO())
+
+    @override_settings(TIMELINE_LENGTH=3, TIMELINE_SLACK=0)
+    def test_timeline_is_bounded(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(5)]
+        self.trim()
+        self.assertEqual(self.timeline(),
+                         [post.id for post in reversed(posts[2:])])
+
+    @override_settings(TIMELINE_LENGTH=3, TIMELINE_SLACK=2)
+    def test_timeline_is_trimmed_past_slack(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=f'Пост {i}', author=self.author)
+                 for i in range(6)]
+        self.trim()
+        self.assertEqual(self.timeline(),
+                         [post.id for post in reversed(posts[3:])])
+        Post.objects.create(text='Ещё', author=self.author)
+        self.trim()
+        self.assertEqual(len(self.timeline()), 4)
+
+    @override_settings(TIMELINE_LENGTH=3, TIMELINE_SLACK=0)
+    def test_trim_walks_users_in_batches(self):
+        readers = User.objects.bulk_create(
+            User(username=f'reader{i}') for i in range(5))
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=self.author)
+            for reader in User.objects.filter(username__in=[
+                reader.username for reader in readers]))
+        for i in range(4):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        output = StringIO()
+        call_command('trim_timelines', '--batch-size=2', stdout=output)
+        self.assertIn('Обрезано лент: 5', output.getvalue())
+        self.assertEqual(TimelineEntry.objects.count(), 15)
+
+    @override_settings(TIMELINE_LENGTH=3, TIMELINE_SLACK=0)
+    def test_fan_out_does_not_read_timelines(self):
+        readers = User.objects.bulk_create(
+            User(username=f'reader{i}') for i in range(30))
+        Follow.objects.bulk_create(
+            Follow(user=reader, author=self.author)
+            for reader in User.objects.filter(username__in=[
+                reader.username for reader in readers]))
+        for i in range(4):
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+        with CaptureQueriesContext(connection) as queries:
+            Post.objects.create(text='Новый', author=self.author)
+        self.assertLess(len(queries), 20)
+        timeline = [query['sql'] for query in queries
+                    if 'posts_timelineentry' in query['sql']]
+        self.assertEqual(len(timeline), 1)
+        self.assertTrue(timeline[0].startswith('INSERT'))
+        self.assertEqual(TimelineEntry.objects.filter(
+            user__username='reader0').count(), 5)
+
+    def test_rebuild_command_restores_timeline(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline(), [post.id])
+
+    def test_rebuild_command_refreshes_cached_feed(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Пост', author=self.author)
+        TimelineEntry.objects.all().delete()
+        cache.clear()
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertNotContains(response, post.text)
+        call_command('rebuild_timelines', stdout=StringIO())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, post.text)
+
+
+@override_settings(FOLLOW_FEED_ENGINE='merge', AUTHOR_RECENT_LENGTH=3)
+class MergeFeedTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [User.objects.create_user(username=f'writer{i}')
+                       for i in range(3)]
+        for i in range(4):
+            for author in cls.authors:
+                Post.objects.create(text=f'Пост {i}', author=author)
+        Post.objects.create(text='Чужой', author=User.objects.create_user(
+            username='stranger'))
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, cursor=None):
+        paginator = MergePaginator(
+            [author.id for author in self.authors], 5)
+        return paginator.get_cursor_page(cursor), paginator
+
+    def test_merge_matches_database_order(self):
+        seen = []
+        page, paginator = self.walk()
+        seen.extend(page)
+        while page.has_next():
+            page, paginator = self.walk(paginator.next_cursor)
+            seen.extend(page)
+        self.assertEqual(seen, list(Post.objects.filter(
+            author__in=self.authors).order_by('-pub_date', '-id')))
+
+    def test_cold_authors_load_in_one_query(self):
+        with self.assertNumQueries(1):
+            keys = recent_keys([author.id for author in self.authors])
+        for author, author_keys in zip(self.authors, keys):
+            self.assertEqual(author_keys, list(Post.objects.filter(
+                author=author).values_list('pub_date', 'id')[:3]))
+
+    def test_backward_page_is_merged(self):
+        first, paginator = self.walk()
+        self.walk(paginator.next_cursor)
+        second, paginator = self.walk(paginator.next_cursor)
+        back, _ = self.walk(paginator.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_warm_page_reads_only_hydration_query(self):
+        self.walk()
+        with CaptureQueriesContext(connection) as queries:
+            page, _ = self.walk()
+        self.assertEqual(len(page), 5)
+        self.assertEqual(len(queries), 1)
+
+    def test_new_post_resets_author_list(self):
+        self.walk()
+        post = Post.objects.create(text='Свежий', author=self.authors[0])
+        page, _ = self.walk()
+        self.assertEqual(page[0], post)
+
+    def test_follow_index_uses_merge(self):
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('posts:follow_index'))
+        self.assertIsInstance(response.context['page_obj'].paginator,
+                              MergePaginator)
+        self.assertEqual(len(response.context['page_obj']), 10)
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -52,10 +53,11 @@ class PostPagesTests(TestCase):
         self.assertRedirects(response, reverse('posts:profile',
                              kwargs={'username': 'Test'}))
         self.assertEqual(Post.objects.count(), tasks_count + 1)
+        digest = hashlib.sha256(small_gif).hexdigest()
         self.assertTrue(
             Post.objects.filter(
                 text='Test',
-                image='posts/small.gif'
+                image=f'posts/{digest[:2]}/{digest}.gif'
             ).exists()
         )
 
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError
 from django.test import TestCase
 
-from ..models import Post, Group
+from ..models import Follow, Post, Group
 
 User = get_user_model()
 
@@ -28,3 +29,9 @@ class PostModelTest(TestCase):
         test_post = PostModelTest.post
         expected_object_names = test_post.text[:15]
         self.assertEqual(expected_object_names, str(test_post))
+
+    def test_follow_is_unique(self):
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=PostModelTest.user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=PostModelTest.user, author=author)
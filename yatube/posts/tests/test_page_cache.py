@@ -0,0 +1,192 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import Client, RequestFactory, TestCase
+from django.urls import reverse
+from posts.feeds import FOLLOW_GENERATION
+from posts.models import Comment, Follow, Group, Post
+
+from core.cache import LOCK_KEY, get_generation, page_key
+
+User = get_user_model()
+
+
+class FeedPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.post = Post.objects.create(text='Первый', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_index_is_served_from_cache(self):
+        self.client.get(reverse('posts:index'))
+        # Обход сигналов: страница не должна пересобраться сама.
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Первый')
+        self.assertIsNone(response.context)
+
+    def test_new_post_is_visible_immediately(self):
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:group_list', args=['group']))
+        Post.objects.create(text='Второй', author=self.author,
+                            group=self.group)
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            'Второй')
+        self.assertContains(
+            self.client.get(reverse('posts:group_list', args=['group'])),
+            'Второй')
+
+    def test_edit_and_delete_invalidate_page(self):
+        self.client.get(reverse('posts:index'))
+        self.post.text = 'Правка'
+        self.post.save()
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            'Правка')
+        self.post.delete()
+        self.assertNotContains(self.client.get(reverse('posts:index')),
+                               'Правка')
+
+    def test_pages_are_cached_per_user(self):
+        self.client.get(reverse('posts:index'))
+        self.client.force_login(self.author)
+        self.assertContains(self.client.get(reverse('posts:index')),
+                            'author')
+
+    def test_stale_page_is_served_during_rebuild(self):
+        url = reverse('posts:index')
+        self.client.get(url)
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        # Страницу уже пересобирает другой запрос.
+        cache.add(LOCK_KEY.format(page_key(request, 'feed')), 1)
+        Post.objects.create(text='Второй', author=self.author)
+        self.assertNotContains(self.client.get(url), 'Второй')
+        cache.delete(LOCK_KEY.format(page_key(request, 'feed')))
+        self.assertContains(self.client.get(url), 'Второй')
+
+
+class FollowPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.stranger = User.objects.create_user(username='stranger')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(text='Первый', author=cls.author,
+                                       group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+        self.url = reverse('posts:follow_index')
+
+    def generation(self):
+        return get_generation(FOLLOW_GENERATION.format(self.reader.pk))
+
+    def test_follow_page_is_served_from_cache(self):
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Первый')
+        self.assertIsNone(response.context)
+
+    def test_followed_author_changes_invalidate_page(self):
+        self.client.get(self.url)
+        self.post.text = 'Правка'
+        self.post.save()
+        self.assertContains(self.client.get(self.url), 'Правка')
+        Post.objects.create(text='Второй', author=self.author)
+        self.assertContains(self.client.get(self.url), 'Второй')
+        self.post.delete()
+        self.assertNotContains(self.client.get(self.url), 'Правка')
+
+    def test_comments_update_summary_without_invalidation(self):
+        self.client.get(self.url)
+        generations = self.generation(), get_generation('feed')
+        Comment.objects.create(post=self.post, author=self.stranger,
+                               text='Реплика')
+        self.assertEqual((self.generation(), get_generation('feed')),
+                         generations)
+        response = self.client.get(self.url)
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Комментариев: 1')
+        self.assertContains(response, 'stranger: Реплика')
+
+    def test_other_authors_do_not_invalidate_page(self):
+        generation = self.generation()
+        Post.objects.create(text='Чужой', author=self.stranger)
+        self.assertEqual(self.generation(), generation)
+
+    def test_follow_and_unfollow_invalidate_page(self):
+        self.client.get(self.url)
+        self.client.get(reverse('posts:profile_follow', args=['stranger']))
+        Post.objects.create(text='Чужой', author=self.stranger)
+        self.assertContains(self.client.get(self.url), 'Чужой')
+        self.client.get(reverse('posts:profile_unfollow', args=['stranger']))
+        self.assertNotContains(self.client.get(self.url), 'Чужой')
+
+    def test_group_rename_invalidates_page(self):
+        generation = self.generation()
+        self.group.title = 'Новое имя'
+        self.group.save()
+        self.assertNotEqual(self.generation(), generation)
+
+
+class SharedPageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def get_as(self, user, url):
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        return client.get(url)
+
+    def test_one_cached_body_for_all_users(self):
+        url = reverse('posts:index')
+        self.get_as(self.author, url)
+        response = self.get_as(self.reader, url)
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Пользователь: reader')
+        self.assertNotContains(response, 'изменение поста')
+        self.assertContains(self.get_as(self.author, url), 'изменение поста')
+        self.assertContains(self.get_as(None, url), 'Войти')
+
+    def test_post_page_fills_comment_form_and_edit_link(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.assertNotContains(self.get_as(None, url), 'csrfmiddlewaretoken')
+        response = self.get_as(self.reader, url)
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertNotContains(response, 'редакторировать')
+        self.assertContains(self.get_as(self.author, url), 'редакторировать')
+
+    def test_new_comment_rebuilds_post_page(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.get_as(self.reader, url)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        self.assertContains(self.get_as(self.reader, url), 'Комментарий')
+
+    def test_profile_follow_button_is_per_user(self):
+        url = reverse('posts:profile', args=['author'])
+        self.get_as(None, url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.get_as(self.reader, url)
+        self.assertContains(response, 'Отписаться')
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertNotContains(self.get_as(self.author, url), 'Подписаться')
@@ -0,0 +1,202 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from posts.counters import recount
+from posts.models import Comment, Post
+from posts.paginators import (
+    CursorPaginator, ElidedPaginator, decode_cursor, estimated_count,
+)
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='cursor')
+        Post.objects.bulk_create(
+            Post(text=f'test{i}', author=cls.author) for i in range(25)
+        )
+        # Одинаковая дата у всех постов: порядок держится только на id.
+        Post.objects.update(pub_date=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, cursor=None):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        page = paginator.get_cursor_page(cursor)
+        return page, paginator
+
+    def test_forward_walk_visits_every_post_once(self):
+        seen = []
+        page, paginator = self.walk()
+        seen.extend(post.id for post in page)
+        while page.has_next():
+            page, paginator = self.walk(paginator.next_cursor)
+            seen.extend(post.id for post in page)
+        expected = list(
+            Post.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True)
+        )
+        self.assertEqual(seen, expected)
+        self.assertEqual(page.number, 3)
+        self.assertEqual(len(page), 5)
+
+    def test_backward_walk_returns_previous_page(self):
+        first, paginator = self.walk()
+        second, paginator = self.walk(paginator.next_cursor)
+        back, _ = self.walk(paginator.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertEqual(back.number, 1)
+        self.assertFalse(back.has_previous())
+
+    def test_broken_cursor_gives_first_page(self):
+        self.assertIsNone(decode_cursor('not-a-cursor'))
+        page, _ = self.walk('not-a-cursor')
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), 10)
+
+    def test_page_does_not_count_rows(self):
+        first, paginator = self.walk()
+        with CaptureQueriesContext(connection) as queries:
+            self.walk(paginator.next_cursor)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_index_next_link_uses_cursor(self):
+        response = self.client.get(reverse('posts:index'))
+        next_cursor = response.context['page_obj'].paginator.next_cursor
+        self.assertContains(response, f'?cursor={next_cursor}')
+        response = self.client.get(
+            reverse('posts:index'), {'cursor': next_cursor})
+        self.assertEqual(response.context['page_obj'].number, 2)
+
+
+class ElidedPaginatorTest(TestCase):
+    def test_elided_range_around_current_page(self):
+        paginator = ElidedPaginator(range(1000), 10)
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, '…', 48, 49, 50, 51, 52, '…', 100])
+        self.assertEqual(list(paginator.get_elided_page_range(2)),
+                         [1, 2, 3, 4, '…', 100])
+        self.assertEqual(list(ElidedPaginator(range(30), 10)
+                              .get_elided_page_range(2)), [1, 2, 3])
+
+    def test_given_count_is_not_recounted(self):
+        author = User.objects.create_user(username='given')
+        Post.objects.bulk_create(
+            Post(text=f'test{i}', author=author) for i in range(25))
+        paginator = ElidedPaginator(Post.objects.all(), 10, count=1000000)
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.page(2)
+            self.assertEqual(len(page), 10)
+        self.assertTrue(page.has_next())
+        self.assertEqual(paginator.num_pages, 100000)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+
+    def test_page_past_the_end_gives_last_page(self):
+        author = User.objects.create_user(username='past')
+        Post.objects.bulk_create(
+            Post(text=f'test{i}', author=author) for i in range(25))
+        for count in (25, 1000000):
+            paginator = ElidedPaginator(Post.objects.all(), 10, count=count)
+            page = paginator.get_page(99)
+            self.assertEqual(page.number, 3)
+            self.assertEqual(len(page), 5)
+            self.assertFalse(page.has_next())
+            self.assertEqual(paginator.num_pages, 3)
+            self.assertEqual(page.elided_page_range, [1, 2, 3])
+        page = ElidedPaginator(Post.objects.none(), 10, count=30).page(5)
+        self.assertEqual(page.number, 1)
+        self.assertEqual(len(page), 0)
+
+    def test_underestimated_count_still_reaches_every_page(self):
+        paginator = ElidedPaginator(list(range(100)), 10, count=35)
+        page = paginator.get_page(5)
+        self.assertEqual(list(page), list(range(40, 50)))
+        self.assertTrue(page.has_next())
+        self.assertEqual(page.elided_page_range, [1, 2, 3, 4, 5, 6])
+        page = ElidedPaginator(list(range(100)), 10, count=35).get_page(9)
+        self.assertEqual(page.number, 9)
+        self.assertTrue(page.has_next())
+        page = ElidedPaginator(list(range(100)), 10, count=35).get_page(10)
+        self.assertEqual(list(page), list(range(90, 100)))
+        self.assertFalse(page.has_next())
+        self.assertEqual(page.end_index(), 100)
+
+    def test_estimated_count_reads_sqlite_stat1(self):
+        author = User.objects.create_user(username='stat')
+        Post.objects.bulk_create(
+            Post(text=f'test{i}', author=author) for i in range(12))
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(estimated_count(Post), 12)
+        self.assertNotIn('COUNT', queries[0]['sql'])
+
+    @override_settings(FEED_PAGINATION='numbered')
+    def test_numbered_mode_shows_page_window(self):
+        author = User.objects.create_user(username='window')
+        Post.objects.bulk_create(
+            Post(text=f'test{i}', author=author) for i in range(95))
+        recount()
+        cache.clear()
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'window'}),
+            {'page': 5})
+        page = response.context['page_obj']
+        self.assertEqual(page.elided_page_range,
+                         [1, 2, 3, 4, 5, 6, 7, '…', 10])
+        self.assertContains(response, '?page=10')
+
+
+@override_settings(COMMENTS_PER_PAGE=2)
+class CommentPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text=f'Комментарий {i}')
+            for i in range(5)
+        )
+        Comment.objects.update(created=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_post_page_shows_first_chunk(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        self.assertEqual(self.texts(response.context['comments']),
+                         ['Комментарий 0', 'Комментарий 1'])
+        self.assertContains(response, 'Показать ещё')
+
+    def test_load_more_walks_all_comments(self):
+        url = reverse('posts:comments', args=[self.post.pk])
+        for order in ('oldest', 'newest'):
+            seen, cursor = [], ''
+            while cursor is not None:
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        url, {'cursor': cursor, 'order': order})
+                comments = response.context['comments']
+                seen.extend(self.texts(comments))
+                cursor = comments.paginator.next_cursor
+            expected = [f'Комментарий {i}' for i in range(5)]
+            if order == 'newest':
+                expected.reverse()
+            self.assertEqual(seen, expected)
+        self.assertNotContains(response, 'Показать ещё')
@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    """Число запросов каждой страницы не зависит от объёма данных."""
+
+    posts_count = 10
+    comments_count = 10
+    # У лент — и запрос последних комментариев к постам страницы.
+    budgets = {
+        'index': 4,
+        'group_list': 5,
+        'profile': 6,
+        'follow_index': 4,
+        'post_detail': 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Post.objects.bulk_create(
+            (Post(text=f'Пост {i}', author=cls.author,
+                  group=cls.group if i % 2 else None)
+             for i in range(cls.posts_count))
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            (Comment(post=cls.post, author=cls.reader, text=f'Ответ {i}')
+             for i in range(cls.comments_count))
+        )
+        Post.objects.filter(pk=cls.post.pk).update(
+            comments_count=cls.comments_count)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def check_budget(self, name, *args):
+        url = reverse(f'posts:{name}', args=args)
+        with self.assertMaxQueries(self.budgets[name]):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_index(self):
+        self.check_budget('index')
+
+    def test_group_posts(self):
+        self.check_budget('group_list', 'group')
+
+    def test_profile(self):
+        self.check_budget('profile', 'author')
+
+    def test_follow_index(self):
+        self.check_budget('follow_index')
+
+    def test_post_detail(self):
+        self.check_budget('post_detail', self.post.id)
+
+
+class ThousandPostsQueryBudgetTest(QueryBudgetTest):
+    posts_count = 1000
+    comments_count = 100
+
+
+class HundredThousandPostsQueryBudgetTest(QueryBudgetTest):
+    posts_count = 100000
+    comments_count = 1000
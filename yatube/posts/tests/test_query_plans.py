@@ -0,0 +1,101 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+$')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+
+
+class QueryPlanTest(TestCase):
+    """Запросы страниц не читают таблицы целиком и не сортируют на лету."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(15)
+        )
+        cls.post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Ответ {i}')
+            for i in range(5)
+        )
+        # bulk_create не шлёт сигналов; счётчик нужен, чтобы ленты
+        # запросили последний комментарий.
+        Post.objects.filter(pk=cls.post.pk).update(comments_count=5)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def plans(self, url):
+        # Иначе страницу отдаст кэш, и её запросы не попадут в проверку.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT'):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def assert_plans_use_indexes(self, url):
+        checked = []
+        for sql, plan in self.plans(url):
+            checked.append(sql)
+            for step in plan:
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertIsNone(FULL_SCAN.search(step))
+                    self.assertIsNone(TEMP_SORT.search(step))
+        return checked
+
+    def feed_urls(self, name, *args):
+        first = reverse(name, args=args)
+        cursor = self.client.get(first).context['page_obj'].paginator
+        return first, f'{first}?cursor={cursor.next_cursor}'
+
+    def test_index(self):
+        first, second = self.feed_urls('posts:index')
+        checked = self.assert_plans_use_indexes(first)
+        # Проверены и сама лента, и сводки комментариев под карточками.
+        self.assertTrue(any('FROM "posts_post"' in sql for sql in checked))
+        self.assertTrue(any('FROM "posts_comment"' in sql for sql in checked))
+        self.assert_plans_use_indexes(second)
+
+    def test_group_posts(self):
+        for url in self.feed_urls('posts:group_list', 'group'):
+            self.assert_plans_use_indexes(url)
+
+    def test_profile(self):
+        for url in self.feed_urls('posts:profile', 'author'):
+            self.assert_plans_use_indexes(url)
+
+    def test_follow_index(self):
+        for url in self.feed_urls('posts:follow_index'):
+            self.assert_plans_use_indexes(url)
+
+    def test_post_detail(self):
+        self.assert_plans_use_indexes(
+            reverse('posts:post_detail', args=[self.post.id]))
+
+    def test_comments(self):
+        url = reverse('posts:comments', args=[self.post.id])
+        self.assert_plans_use_indexes(url)
+        self.assert_plans_use_indexes(f'{url}?order=newest')
@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from posts import thumbnails
+from posts.models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+def uploaded(name, content=SMALL_GIF):
+    return SimpleUploadedFile(name=name, content=content,
+                              content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+
+    def test_same_content_is_stored_once(self):
+        first = Post.objects.create(text='Первый', author=self.author,
+                                    image=uploaded('cat.gif'))
+        second = Post.objects.create(text='Второй', author=self.author,
+                                     image=uploaded('копия.GIF'))
+        self.assertEqual(first.image.name, second.image.name)
+        directory = os.path.dirname(first.image.path)
+        self.assertEqual(os.listdir(directory),
+                         [os.path.basename(first.image.name)])
+
+    def test_reused_file_gets_fresh_mtime(self):
+        storage = Post._meta.get_field('image').storage
+        name = storage.save('posts/a.gif', ContentFile(SMALL_GIF))
+        os.utime(storage.path(name), (0, 0))
+        self.assertEqual(storage.save('posts/b.gif', ContentFile(SMALL_GIF)),
+                         name)
+        self.assertGreater(os.path.getmtime(storage.path(name)), 0)
+
+    def test_storage_leaves_no_partial_files(self):
+        storage = Post._meta.get_field('image').storage
+        name = storage.save('posts/a.gif', ContentFile(SMALL_GIF))
+        self.assertEqual(storage.save('posts/b.gif', ContentFile(SMALL_GIF)),
+                         name)
+        leftovers = [file for _, _, files in os.walk(TEMP_MEDIA_ROOT)
+                     for file in files if file.endswith('.part')]
+        self.assertEqual(leftovers, [])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SweepMediaTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        author = User.objects.create_user(username='author')
+        self.kept = Post.objects.create(text='Остаётся', author=author,
+                                        image=uploaded('cat.gif'))
+        self.post = Post.objects.create(
+            text='Правится', author=author,
+            image=uploaded('dog.gif', OTHER_GIF))
+        self.old = self.post.image.path
+        thumbnails.generate(self.post.image.name)
+        self.old_thumbnails = self.files('cache')
+        self.post.image = ''
+        self.post.save()
+        self.stray = os.path.join(TEMP_MEDIA_ROOT, 'cache', 'zz', 'x.jpg')
+        os.makedirs(os.path.dirname(self.stray), exist_ok=True)
+        open(self.stray, 'wb').close()
+
+    def files(self, directory):
+        return {os.path.join(path, name) for path, _, names in os.walk(
+            os.path.join(TEMP_MEDIA_ROOT, directory)) for name in names}
+
+    def sweep(self, *args):
+        output = StringIO()
+        call_command('sweep_media', '--min-age=0', *args, stdout=output)
+        return output.getvalue()
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.sweep('--dry-run')
+        self.assertIn('Нашлось бы файлов картинок без постов: 1', output)
+        self.assertTrue(os.path.exists(self.old))
+        self.assertTrue(os.path.exists(self.stray))
+
+    def test_sweep_removes_orphans_only(self):
+        self.sweep('--batch-size=1', '--workers=2')
+        self.assertFalse(os.path.exists(self.old))
+        self.assertFalse(os.path.exists(self.stray))
+        self.assertEqual(self.files('cache') & self.old_thumbnails, set())
+        self.assertTrue(os.path.exists(self.kept.image.path))
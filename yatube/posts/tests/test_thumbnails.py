@@ -0,0 +1,171 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts import thumbnails
+from posts.models import Post
+from posts.templatetags.post_cards import card_stats
+from sorl.thumbnail import default
+
+from core.cache import bump_generation
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+QUEUE_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+THUMBNAIL = '<img class="card-img my-2"'
+PLACEHOLDER = 'card-img my-2 bg-light'
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name=name, content=SMALL_GIF,
+                              content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DeferredThumbnailTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(text='Текст', author=self.author,
+                                        image=uploaded())
+
+    def detail(self):
+        return self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+
+    def test_page_shows_placeholder_until_thumbnail_is_ready(self):
+        response = self.detail()
+        self.assertContains(response, PLACEHOLDER)
+        self.assertNotContains(response, THUMBNAIL)
+        pending = thumbnails.PENDING_KEY.format(self.post.image.name)
+        self.assertIsNotNone(cache.get(pending))
+
+        thumbnails.generate(self.post.image.name)
+        self.assertIsNone(cache.get(pending))
+        self.assertContains(self.detail(), THUMBNAIL)
+
+    def test_generate_refreshes_cached_cards(self):
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        self.assertContains(self.client.get(profile), PLACEHOLDER)
+        thumbnails.generate(self.post.image.name)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version,
+                         self.post.version + 1)
+        self.assertContains(self.client.get(profile), THUMBNAIL)
+
+    def test_picture_lists_every_width(self):
+        thumbnails.generate(self.post.image.name)
+        response = self.detail()
+        self.assertContains(response, '<picture>')
+        for width, _ in thumbnails.SIZES:
+            self.assertContains(response, f' {width}w')
+        for format_ in thumbnails.MODERN_FORMATS:
+            self.assertContains(
+                response, f'type="{thumbnails.MIME_TYPES[format_]}"')
+
+    def test_modern_formats_get_own_extension(self):
+        for format_, extension in (('WEBP', 'webp'), ('AVIF', 'avif')):
+            thumbnail = default.backend.thumbnail_file(
+                self.post.image, '480x170', {'format': format_})
+            self.assertTrue(thumbnail.name.endswith(f'.{extension}'))
+
+    def test_post_without_image_has_no_placeholder(self):
+        post = Post.objects.create(text='Без картинки', author=self.author)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.id]))
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_feed_page_reads_thumbnails_in_one_query(self):
+        for i in range(4):
+            post = Post.objects.create(text=f'Пост {i}', author=self.author,
+                                       image=uploaded(f'feed{i}.gif'))
+            thumbnails.generate(post.image.name)
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(profile)
+        self.assertEqual(response.content.decode().count(THUMBNAIL), 5)
+        kvstore = [query for query in queries
+                   if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore), 1)
+        self.assertEqual(card_stats()['misses'], 5)
+
+        bump_generation('feed')
+        self.client.get(profile)
+        self.assertEqual(card_stats()['hits'], 5)
+
+    def test_get_many_falls_back_to_database_once(self):
+        thumbnails.generate(self.post.image.name)
+        thumbnail = default.backend.thumbnail_file(
+            self.post.image, *thumbnails.VARIANTS[0][2:])
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            found = default.kvstore.get_many([thumbnail])
+            default.kvstore.get_many([thumbnail])
+        self.assertEqual(found[thumbnail.key].name, thumbnail.name)
+        self.assertEqual(len(queries), 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   THUMBNAIL_QUEUE_PATH=f'{QUEUE_DIR}/queue.sqlite3')
+class UploadThumbnailTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(QUEUE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        thumbnails.queue().execute('DELETE FROM queue')
+        self.author = User.objects.create_user(username='uploader')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def create(self):
+        self.client.post(reverse('posts:post_create'),
+                         {'text': 'С картинкой', 'image': uploaded('up.gif')})
+        post = Post.objects.get(text='С картинкой')
+        return reverse('posts:post_detail', args=[post.id])
+
+    def test_upload_is_queued_for_background_worker(self):
+        url = self.create()
+        self.assertContains(self.client.get(url), PLACEHOLDER)
+        self.assertIsNotNone(thumbnails.oldest_age())
+        output = StringIO()
+        call_command('generate_thumbnails', stdout=output)
+        self.assertIn('1', output.getvalue())
+        self.assertIsNone(thumbnails.oldest_age())
+        bump_generation('feed')
+        self.assertContains(self.client.get(url), THUMBNAIL)
+
+    @override_settings(THUMBNAIL_FALLBACK_DELAY=0)
+    def test_overdue_queue_is_drained_after_response(self):
+        url = self.create()
+        self.assertIsNone(thumbnails.oldest_age())
+        self.assertContains(self.client.get(url), THUMBNAIL)
@@ -133,9 +133,7 @@ class PostPagesTests(TestCase):
     def test_show_comment(self):
         response = (self.authorized_client.get(reverse('posts:post_detail',
                     args={self.post.id})))
-        self.assertEqual(response.context.get('comments').
-                         get(text='Тестовый текст'),
-                         self.comment)
+        self.assertIn(self.comment, response.context.get('comments'))
 
     def test_create_comment_unauthorized_user(self):
         response = self.guest_client.get(reverse('posts:add_comment',
@@ -191,14 +189,15 @@ class FollowPagesTest(TestCase):
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         self.guest_client = Client()
+        cache.clear()
 
     def test_user_subscriptions(self):
         """Авторизованный пользователь может подписаться"""
         self.authorized_client.get(reverse('posts:profile_follow',
                                    kwargs={'username': 'Test2'}))
-        follow = Follow.objects.create(user=self.user,
+        follow = Follow.objects.filter(user=self.user,
                                        author=self.post2.author)
-        self.assertTrue(follow)
+        self.assertEqual(follow.count(), 1)
 
     def test_show_post_user_subscriptions(self):
         """У авторизо-го поль-я появляются посты поль-й, на ктр он подписан"""
@@ -247,11 +246,12 @@ class CashTest(TestCase):
         self.authorized_client.force_login(self.post3.author)
 
     def test_cache(self):
-        """проверяем контекст после удаления поста и"""
-        """после отчистки кеша"""
+        """повторный запрос берётся из кеша, удаление поста сбрасывает"""
+        """закешированную страницу"""
+        self.authorized_client.get(reverse('posts:index'))
         response = self.authorized_client.get(reverse('posts:index'))
-        test_context_before_delete = response.context
-        self.post3.delete()
-        self.assertEqual(test_context_before_delete, response.context)
-        cache.clear()
         self.assertFalse(response.context)
+        self.assertContains(response, 'Тестовый текст для кеша')
+        self.post3.delete()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'Тестовый текст для кеша')
@@ -0,0 +1,21 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка «не больше N запросов» для ``TestCase``."""
+
+    @contextmanager
+    def assertMaxQueries(self, limit, using=DEFAULT_DB_ALIAS):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        executed = len(context)
+        self.assertLessEqual(
+            executed, limit,
+            f'{executed} запросов при бюджете {limit}:\n' + '\n'.join(
+                f'{number}. {query["sql"]}' for number, query
+                in enumerate(context.captured_queries, start=1)
+            )
+        )
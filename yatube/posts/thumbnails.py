@@ -0,0 +1,283 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_finished, request_started
+from django.db import transaction
+from django.dispatch import receiver
+from PIL import Image
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE, KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import local_db
+from core.cache import bump_generation
+
+from . import feeds
+from .models import Post
+from .signals import bump_versions
+
+logger = logging.getLogger(__name__)
+
+# Ширины и высоты картинки поста; 960 — размер для <img> по умолчанию.
+SIZES = ((480, 170), (960, 339), (1440, 508))
+DEFAULT_WIDTH = 960
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+
+
+def _can_save(format_):
+    Image.init()
+    return format_ in Image.SAVE
+
+
+# Современные форматы — только те, что умеет сохранять установленный
+# Pillow; без них остаются варианты в THUMBNAIL_FORMAT (JPEG).
+MODERN_FORMATS = tuple(
+    format_ for format_ in ('AVIF', 'WEBP') if _can_save(format_))
+
+
+def _variants():
+    for format_ in MODERN_FORMATS + (None,):
+        for width, height in SIZES:
+            options = {'crop': 'center', 'upscale': True}
+            if format_:
+                options['format'] = format_
+            yield format_, width, f'{width}x{height}', options
+
+
+# Все варианты миниатюр картинки поста: (формат, ширина, геометрия,
+# опции sorl). Формат ``None`` — запасной, THUMBNAIL_FORMAT.
+VARIANTS = tuple(_variants())
+PENDING_KEY = 'posts:thumbnail:pending:{}'
+PENDING_TIMEOUT = 60 * 10
+QUEUE_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS queue ('
+    ' name TEXT PRIMARY KEY, queued REAL NOT NULL, claim TEXT, claimed REAL)',
+)
+# Картинку, забранную упавшим процессом, через столько секунд берёт
+# следующий.
+CLAIM_TIMEOUT = 60 * 10
+
+_local = threading.local()
+
+
+class DeferredThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который в запросе только читает готовые миниатюры.
+
+    Если миниатюры ещё нет, картинка ставится в очередь, а шаблон
+    получает ``None`` и показывает заглушку. Сами миниатюры создаются
+    в ``generate``.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if getattr(_local, 'generating', False):
+            return super().get_thumbnail(file_, geometry_string, **options)
+        thumbnail = self.lookup(file_, geometry_string, options)
+        if thumbnail is None:
+            schedule(str(file_))
+        return thumbnail
+
+    def thumbnail_file(self, file_, geometry_string, options):
+        """Файл миниатюры с тем именем, которое дал бы ей sorl."""
+        source = ImageFile(file_)
+        options = dict(options)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        # sorl не знает расширения AVIF.
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = '%s/%s/%s' % (key[:2], key[2:4], key)
+        extension = EXTENSIONS.get(options['format'],
+                                   options['format'].lower())
+        return '%s%s.%s' % (thumbnail_settings.THUMBNAIL_PREFIX, path,
+                            extension)
+
+    def lookup(self, file_, geometry_string, options):
+        """Готовая миниатюра или ``None``.
+
+        Сначала смотрит то, что заранее прочитал ``prefetch_thumbnails``,
+        и только потом идёт в хранилище ключей sorl.
+        """
+        thumbnail = self.thumbnail_file(file_, geometry_string, options)
+        prefetched = getattr(file_, 'prefetched_thumbnails', None)
+        if prefetched is not None and thumbnail.name in prefetched:
+            return prefetched[thumbnail.name]
+        return default.kvstore.get(thumbnail)
+
+
+class BulkKVStore(KVStore):
+    """Хранилище ключей sorl (кэш поверх БД), умеющее читать пачкой.
+
+    ``get_many`` делает один ``cache.get_many`` и, если чего-то в кэше
+    нет, один запрос к БД вместо обращения на каждую миниатюру.
+    """
+
+    def get_many(self, image_files):
+        """Словарь ``{image_file.key: ImageFile}`` для найденных файлов."""
+        keys = {add_prefix(image_file.key): image_file.key
+                for image_file in image_files}
+        values = self.cache.get_many(list(keys))
+        missing = [key for key in keys if key not in values]
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            fetched = {key: found.get(key, EMPTY_VALUE) for key in missing}
+            self.cache.set_many(fetched,
+                                thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return {
+            keys[key]: deserialize_image_file(value)
+            for key, value in values.items()
+            if value and value != EMPTY_VALUE
+        }
+
+
+def prefetch_thumbnails(posts):
+    """Читает миниатюры картинок всех ``posts`` одной пачкой.
+
+    Найденное запоминается в ``post.image``, и ``post_picture`` берёт
+    миниатюры оттуда, не обращаясь к хранилищу ключей.
+    """
+    wanted = []
+    for post in posts:
+        if not post.image:
+            continue
+        post.image.prefetched_thumbnails = {}
+        for _, _, geometry, options in VARIANTS:
+            wanted.append((post.image, default.backend.thumbnail_file(
+                post.image, geometry, options)))
+    if not wanted:
+        return
+    found = default.kvstore.get_many(
+        [thumbnail for _, thumbnail in wanted])
+    for image, thumbnail in wanted:
+        image.prefetched_thumbnails[thumbnail.name] = found.get(
+            thumbnail.key)
+
+
+def generate(name):
+    """Создаёт все варианты миниатюр картинки ``name``.
+
+    Карточки и страницы с этой картинкой закэшированы с заглушкой,
+    поэтому после генерации их версии сдвигаются. После ошибки метка
+    очереди остаётся до истечения, чтобы битая или пропавшая картинка
+    не ставилась в очередь на каждом показе.
+    """
+    # Имя миниатюры зависит от хранилища исходника, а у поля оно своё.
+    source = ImageFile(name, Post._meta.get_field('image').storage)
+    _local.generating = True
+    try:
+        if not source.exists():
+            logger.warning('Нет файла картинки %s', name)
+            return
+        for _, _, geometry, options in VARIANTS:
+            default.backend.get_thumbnail(source, geometry, **options)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+        return
+    finally:
+        _local.generating = False
+    cache.delete(PENDING_KEY.format(name))
+    bump_versions(Post.objects.filter(image=name))
+    bump_generation('feed')
+    feeds.invalidate_followers(author__posts__image=name)
+
+
+def schedule(name):
+    """Ставит картинку в очередь на генерацию после фиксации транзакции.
+
+    Вне запроса миниатюры создаются сразу. Повторные вызовы, пока
+    картинка в очереди, ничего не делают.
+    """
+    if not name or not cache.add(PENDING_KEY.format(name), 1,
+                                 PENDING_TIMEOUT):
+        return
+    transaction.on_commit(lambda: _enqueue(name))
+
+
+def _enqueue(name):
+    if getattr(_local, 'in_request', False):
+        queue().execute(
+            'INSERT OR IGNORE INTO queue (name, queued) VALUES (?, ?)',
+            (name, time.time()))
+    else:
+        generate(name)
+
+
+def queue():
+    """Очередь картинок, ждущих миниатюр: ``THUMBNAIL_QUEUE_PATH``."""
+    return local_db.connection(
+        _local, settings.THUMBNAIL_QUEUE_PATH, QUEUE_SCHEMA)
+
+
+def oldest_age():
+    """Сколько секунд ждёт самая старая картинка, ``None`` — никто."""
+    row = queue().execute(
+        'SELECT queued FROM queue ORDER BY rowid LIMIT 1').fetchone()
+    return None if row is None else time.time() - row[0]
+
+
+def drain():
+    """Готовит миниатюры всех картинок очереди, возвращает их число.
+
+    Картинку забирают меткой, поэтому разбирать очередь могут несколько
+    процессов сразу; метку упавшего через ``CLAIM_TIMEOUT`` снимает
+    следующий.
+    """
+    done = 0
+    while True:
+        claim, now = uuid.uuid4().hex, time.time()
+        queue().execute(
+            'UPDATE queue SET claim = ?, claimed = ? WHERE rowid IN ('
+            ' SELECT rowid FROM queue WHERE claim IS NULL OR claimed < ?'
+            ' ORDER BY rowid LIMIT 1)', (claim, now, now - CLAIM_TIMEOUT))
+        row = queue().execute(
+            'SELECT name FROM queue WHERE claim = ?', (claim,)).fetchone()
+        if row is None:
+            return done
+        generate(row[0])
+        queue().execute('DELETE FROM queue WHERE claim = ?', (claim,))
+        done += 1
+
+
+@receiver(request_started)
+def _start_request(sender, **kwargs):
+    _local.in_request = True
+
+
+@receiver(request_finished)
+def _drain_overdue(sender, **kwargs):
+    """Запасной путь, если ``generate_thumbnails --loop`` не запущен.
+
+    Очередь, ждущую дольше ``THUMBNAIL_FALLBACK_DELAY`` секунд, разбирает
+    воркер после ответа. Пока фоновый процесс успевает, запросы не
+    платят за работу с картинками.
+    """
+    _local.in_request = False
+    if not os.path.exists(settings.THUMBNAIL_QUEUE_PATH):
+        return
+    try:
+        age = oldest_age()
+        if age is not None and age >= settings.THUMBNAIL_FALLBACK_DELAY:
+            drain()
+    except Exception:
+        logger.exception('Не удалось разобрать очередь миниатюр')
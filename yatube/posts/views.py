@@ -1,12 +1,17 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from core.cache import conditional_page, generation_cache_page
+
+from . import comment_queue, conditions, feeds, thumbnails
+from .counters import stats_for
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from .models import Follow, Group, Post
+from .paginators import (
+    cached_count, comment_page, estimated_count, paginate,
+)
 
 User = get_user_model()
 
@@ -22,6 +27,8 @@ def post_edit(request, post_id):
                     instance=post)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post.image.name)
         return redirect('posts:post_detail', post.id)
     return render(request, 'posts/create_post.html',
                   {'form': form, 'is_edit': is_edit, 'post': post})
@@ -36,17 +43,21 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post.image.name)
         return redirect('posts:profile', username=post.author)
     return render(request, 'posts/create_post.html',
                   {'form': form, 'is_edit': is_edit})
 
 
+@conditional_page(conditions.feed)
+@generation_cache_page('feed', settings.FEED_CACHE_TIMEOUT,
+                       settings.FEED_CACHE_SOFT_TIMEOUT, shared=True)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.VAR_LIMITER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = paginate(
+        request, posts,
+        count=lambda: cached_count(group.posts.all(), f'group:{group.pk}'))
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -54,61 +65,75 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
-@cache_page(20)
+@conditional_page(conditions.feed)
+@generation_cache_page('feed', settings.FEED_CACHE_TIMEOUT,
+                       settings.FEED_CACHE_SOFT_TIMEOUT, shared=True)
 def index(request):
     posts = Post.objects.select_related('author', 'group').all()
-    paginator = Paginator(posts, settings.VAR_LIMITER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate(request, posts,
+                        count=lambda: estimated_count(Post))
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional_page(conditions.profile)
+@generation_cache_page('feed', settings.FEED_CACHE_TIMEOUT,
+                       settings.FEED_CACHE_SOFT_TIMEOUT, shared=True,
+                       version=conditions.profile_version)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    if (not request.user.is_anonymous
-            and Follow.objects.filter(user=request.user, author=author).all()):
-        following = True
-    else:
-        following = False
+    author = getattr(request, 'validated', None) or get_object_or_404(
+        conditions.authors(request), username=username)
     request_user = request.user
-    author_posts = Post.objects.filter(author=author).all()
-    author_posts_count = author_posts.count()
-    paginator = Paginator(author_posts, settings.VAR_LIMITER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author_posts = Post.objects.filter(author=author).select_related(
+        'author', 'group')
+    stats = stats_for(author)
+    page_obj = paginate(request, author_posts, count=stats.posts_count)
     context = {
         'author': author,
         'request_user': request_user,
-        'author_posts_count': author_posts_count,
+        'author_posts_count': stats.posts_count,
+        'stats': stats,
         'page_obj': page_obj,
-        'following': following,
+        'following': author.is_followed,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(conditions.post_detail)
+@generation_cache_page('feed', settings.FEED_CACHE_TIMEOUT,
+                       settings.FEED_CACHE_SOFT_TIMEOUT, shared=True,
+                       version=conditions.post_version)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    author = post.author
-    author_posts = author.posts.all()
+    post = getattr(request, 'validated', None) or get_object_or_404(
+        conditions.posts(), pk=post_id)
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=post).all()
-    author_posts_count = author_posts.count()
+    comments = comment_page(request, post.id)
     context = {
         'post': post,
-        'author_posts_count': author_posts_count,
+        'author_posts_count': stats_for(post.author).posts_count,
         'form': form,
         'comments': comments
     }
     return render(request, 'posts/post_detail.html', context,)
 
 
+def comments(request, post_id):
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    return render(request, 'posts/includes/comment_list.html',
+                  {'post_id': post_id,
+                   'comments': comment_page(request, post_id)})
+
+
 @login_required
 def add_comment(request, post_id):
     form = CommentForm(request.POST or None)
-    if form.is_valid():
+    if form.is_valid() and comment_queue.is_queued():
+        # Пост проверит flush: ответ не ждёт ни SELECT, ни INSERT.
+        comment_queue.push(post_id, request.user.pk,
+                           form.cleaned_data['text'])
+    elif form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = Post.objects.get(pk=post_id)
@@ -117,11 +142,10 @@ def add_comment(request, post_id):
 
 
 @login_required
+@generation_cache_page(feeds.follow_generation, settings.FEED_CACHE_TIMEOUT,
+                       settings.FEED_CACHE_SOFT_TIMEOUT)
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user).all()
-    paginator = Paginator(posts, settings.VAR_LIMITER)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = feeds.follow_page(request)
     context = {
         'page_obj': page_obj
     }
@@ -131,10 +155,8 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     post_author = get_object_or_404(User, username=username)
-    follow_exists = Follow.objects.filter(user=request.user,
-                                          author=post_author).all().exists()
-    if request.user != post_author and not follow_exists:
-        Follow.objects.create(user=request.user, author=post_author)
+    if request.user != post_author:
+        Follow.objects.get_or_create(user=request.user, author=post_author)
     return redirect('posts:profile', username=username)
 
 
@@ -4,7 +4,8 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = '_kmuiwiu8_(6usr#6%gq7m(q1cm=rz4tdnz#op5ik!lr!8rvd5'
 
-DEBUG = True
+# YATUBE_DEBUG=0 — боевой режим: шаблоны разбираются один раз на процесс.
+DEBUG = os.getenv('YATUBE_DEBUG', '1') == '1'
 
 
 INSTALLED_APPS = [
@@ -32,12 +33,22 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+# При DEBUG правки шаблонов видны сразу; в бою cached.Loader держит
+# разобранные шаблоны в памяти, а wsgi.py разбирает их до первого запроса.
+if not DEBUG:
+    TEMPLATE_LOADERS = [
+        ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+    ]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -97,14 +108,85 @@ LOGIN_REDIRECT_URL = 'posts:index'
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 VAR_LIMITER = 10
+COMMENTS_PER_PAGE = 50
+# 'direct' — комментарий пишется в БД в запросе; 'queued' — ложится в
+# локальную очередь COMMENT_QUEUE_PATH, и в БД его пачками по
+# COMMENT_BATCH_SIZE переносит первый запрос после COMMENT_FLUSH_INTERVAL
+# секунд ожидания или manage.py flush_comments --loop.
+COMMENT_INGEST = os.getenv('YATUBE_COMMENT_INGEST', 'direct')
+COMMENT_QUEUE_PATH = os.path.join(BASE_DIR, 'comment_queue.sqlite3')
+COMMENT_FLUSH_INTERVAL = 2
+COMMENT_BATCH_SIZE = 500
+# 'cursor' — листание курсорами без COUNT(*), 'numbered' — номера страниц
+# (окно вокруг текущей) по оценке числа постов.
+FEED_PAGINATION = 'cursor'
+# Точные счётчики пересчитываются раз в COUNT_CACHE_TIMEOUT секунд, а
+# до COUNT_CACHE_HARD_TIMEOUT отдаются устаревшими, пока идёт пересчёт.
+COUNT_CACHE_TIMEOUT = 60 * 5
+COUNT_CACHE_HARD_TIMEOUT = 60 * 60
+TIMELINE_LENGTH = 800
+# Ленты обрезаются, лишь переросши TIMELINE_LENGTH на столько записей.
+# Обрезает их не публикация, а manage.py trim_timelines --loop раз в
+# TIMELINE_TRIM_INTERVAL секунд.
+TIMELINE_SLACK = 100
+TIMELINE_TRIM_INTERVAL = 60 * 10
+# 'timeline' — готовые ленты подписчиков (fan-out при публикации),
+# 'merge' — k-way merge кэшированных списков последних постов авторов.
+FOLLOW_FEED_ENGINE = 'timeline'
+AUTHOR_RECENT_LENGTH = 200
+AUTHOR_RECENT_TIMEOUT = 60 * 60 * 24
+POST_CARD_TIMEOUT = 60 * 60 * 24
+# Сводки комментариев под карточками сбрасываются самими комментариями.
+COMMENT_SUMMARY_TIMEOUT = 60 * 60 * 24
+# Страницы лент живут до смены поколения 'feed', срок — лишь страховка.
+# Поколения хранятся бессрочно (None) или GENERATION_TIMEOUT секунд.
+GENERATION_TIMEOUT = None
+FEED_CACHE_TIMEOUT = 60 * 60 * 4
+FEED_CACHE_SOFT_TIMEOUT = 60 * 10
+# Устаревшую запись кэша пересобирает один запрос под блокировкой;
+# без старой копии остальные ждут его не дольше CACHE_LOCK_WAIT секунд.
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 2
+# Миниатюры готовит manage.py generate_thumbnails --loop из очереди
+# THUMBNAIL_QUEUE_PATH, в запросе шаблоны только читают готовые. Если
+# очередь ждёт дольше THUMBNAIL_FALLBACK_DELAY секунд (фоновый процесс не
+# запущен), её разбирает воркер после ответа.
+THUMBNAIL_QUEUE_PATH = os.path.join(BASE_DIR, 'thumbnail_queue.sqlite3')
+THUMBNAIL_FALLBACK_DELAY = 30
+THUMBNAIL_BACKEND = 'posts.thumbnails.DeferredThumbnailBackend'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.BulkKVStore'
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# None — файлы отдаёт core.media.serve (только при DEBUG);
+# 'x-accel-redirect' (nginx) или 'x-sendfile' — отдаёт фронтовой прокси.
+MEDIA_OFFLOAD = None
+# internal-location nginx, смотрящий в MEDIA_ROOT.
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_MAX_AGE = 60 * 60
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+# Путь к файлу общего кэша включает двухуровневый кэш: L1 в памяти
+# воркера и L2 в SQLite, общий для всех воркеров хоста.
+if os.getenv('YATUBE_SHARED_CACHE'):
+    CACHES['default'] = {
+        'BACKEND': 'core.tiered_cache.TieredCache',
+        'LOCATION': os.getenv('YATUBE_SHARED_CACHE'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'L1_TIMEOUT': 5},
+    }
+else:
+    # У LocMemCache каждый воркер хранит свой кэш, и запись сбрасывает
+    # страницы только в том воркере, где она была. Остальные увидят её,
+    # когда истечёт срок, поэтому без общего кэша сроки короткие. Срок
+    # есть и у поколений, иначе ETag в чужом воркере не сменится вовсе.
+    GENERATION_TIMEOUT = 20
+    FEED_CACHE_SOFT_TIMEOUT = 20
+    AUTHOR_RECENT_TIMEOUT = 20
+    COMMENT_SUMMARY_TIMEOUT = 20
 
 
 ALLOWED_HOSTS = [
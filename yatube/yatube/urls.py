@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.urls import include, path
-from django.conf import settings
-from django.conf.urls.static import static
+
+from core.media import media_urlpatterns
 
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
@@ -11,10 +11,7 @@ urlpatterns = [
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about'))
 ]
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )
+urlpatterns += media_urlpatterns()
 
 handler404 = 'core.views.page_not_found'
 handler403 = 'core.views.csrf_failure'